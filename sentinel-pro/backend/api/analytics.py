@@ -1,90 +1,152 @@
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, HTTPException, Query
+from typing import Optional
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select, func, desc
-from backend.db.models import CrowdLog
+from backend.db.models import CrowdLog, CrowdRollupMinute, CrowdRollupHour, CROWDLOG_SUMMARY_COLUMNS
 from backend.api.deps import get_db
+from backend.db.heatmaps import load_range
+from backend.core.config import HEATMAP_GRID
+from engine.shared_state import state
+from engine.vision.heatmap import heatmaps, downsample, MAP_KEY
 import datetime
+import numpy as np
 
 router = APIRouter()
 
 @router.get("/peak-hour")
-async def get_peak_hour(db: AsyncSession = Depends(get_db)):
+async def get_peak_hour(zone: Optional[str] = None, db: AsyncSession = Depends(get_db)):
     """
     Get the hour of the day with the highest average person count.
-    This is a simplified analytics query.
+    Reads at most 24 rows per zone from the hourly rollup, however many logs were written.
     """
-    # Since sqlite/asyncpg differences can make date truncation complex in raw sql across different DBs,
-    # we'll fetch recent logs and process in python for this MVP or use a simple aggregation.
-    
-    # Fetch logs from last 24 hours
-    one_day_ago = datetime.datetime.now() - datetime.timedelta(days=1)
-    result = await db.execute(
-        select(CrowdLog).where(CrowdLog.timestamp >= one_day_ago)
+    one_day_ago = datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(days=1)
+    hour = func.extract("hour", CrowdRollupHour.bucket)
+    query = (
+        select(hour.label("hour"), func.sum(CrowdRollupHour.total), func.sum(CrowdRollupHour.samples))
+        .where(CrowdRollupHour.bucket >= one_day_ago)
+        .group_by(hour)
     )
-    logs = result.scalars().all()
-    
-    if not logs:
+    if zone is not None:
+        query = query.where(CrowdRollupHour.zone_id == zone)
+    rows = (await db.execute(query)).all()
+
+    if not rows:
         return {"peak_hour": None, "max_count": 0}
 
-    # Aggregate by hour
-    hour_counts = {}
-    for log in logs:
-        # Assuming timestamp is datetime object
-        hour = log.timestamp.hour
-        hour_counts[hour] = hour_counts.get(hour, []) + [log.person_count]
-        
-    # Calculate average per hour
-    peak_hour = -1
-    max_avg = -1
-    
-    hourly_data = []
-    
-    for hour, counts in hour_counts.items():
-        avg = sum(counts) / len(counts)
-        hourly_data.append({"hour": hour, "count": avg})
-        if avg > max_avg:
-            max_avg = avg
-            peak_hour = hour
-            
+    # Average per hour (sum of counts / number of samples across zones)
+    hourly_data = sorted(
+        ({"hour": int(h), "count": float(total) / samples} for h, total, samples in rows if samples),
+        key=lambda x: x['hour']
+    )
+    peak = max(hourly_data, key=lambda x: x['count'])
+
     return {
-        "peak_hour": peak_hour,
-        "max_average_count": max_avg,
-        "hourly_data": sorted(hourly_data, key=lambda x: x['hour'])
+        "peak_hour": peak['hour'],
+        "max_average_count": peak['count'],
+        "hourly_data": hourly_data
     }
 
 @router.get("/history")
 async def get_history(limit: int = 20, db: AsyncSession = Depends(get_db)):
     """Fetch recent logs for chart"""
     result = await db.execute(
-        select(CrowdLog).order_by(desc(CrowdLog.timestamp)).limit(limit)
+        select(*CROWDLOG_SUMMARY_COLUMNS).order_by(desc(CrowdLog.timestamp)).limit(limit)
     )
-    logs = result.scalars().all()
-    return logs
+    return [dict(row) for row in result.mappings()]
 
 @router.get("/trend")
-async def get_trend_data(window_size: int = 5, db: AsyncSession = Depends(get_db)):
-    """Calculate moving average trend"""
-    # Fetch last 200 logs to ensure smooth MA start
-    result = await db.execute(
-        select(CrowdLog).order_by(desc(CrowdLog.timestamp)).limit(200)
+async def get_trend_data(window_size: int = 5, zone: Optional[str] = None, db: AsyncSession = Depends(get_db)):
+    """Calculate moving average trend over per-minute averages (minute rollup)"""
+    # Fetch enough minutes for the last 50 points plus a full window of history
+    query = (
+        select(
+            CrowdRollupMinute.bucket,
+            func.sum(CrowdRollupMinute.total),
+            func.sum(CrowdRollupMinute.samples)
+        )
+        .group_by(CrowdRollupMinute.bucket)
+        .order_by(desc(CrowdRollupMinute.bucket))
+        .limit(50 + window_size)
     )
-    logs = result.scalars().all()
-    
-    if not logs:
+    if zone is not None:
+        query = query.where(CrowdRollupMinute.zone_id == zone)
+    rows = (await db.execute(query)).all()
+
+    if not rows:
         return []
 
     # Reverse to chronological order
-    logs = list(reversed(logs))
-    
+    rows = list(reversed(rows))
+    averages = [float(total) / samples if samples else 0.0 for _, total, samples in rows]
+
     data = []
-    # Calculate simple moving average
-    for i in range(len(logs)):
-        window = logs[max(0, i-window_size+1):i+1]
-        avg = sum([l.person_count for l in window]) / len(window)
+    # Simple moving average with a running window sum
+    window_sum = 0.0
+    for i, (bucket, _, _) in enumerate(rows):
+        window_sum += averages[i]
+        if i >= window_size:
+            window_sum -= averages[i - window_size]
+        avg = window_sum / min(i + 1, window_size)
         data.append({
-            "timestamp": logs[i].timestamp.strftime("%H:%M:%S"),
-            "count": logs[i].person_count,
+            "timestamp": bucket.strftime("%H:%M"),
+            "count": round(averages[i], 1),
             "moving_avg": round(avg, 1)
         })
-        
+
     return data[-50:] # Return last 50 points for display
+
+# Ranges up to this long are answered from minute buckets, longer ones from hour buckets
+HEATMAP_MINUTE_RANGE = datetime.timedelta(hours=6)
+
+@router.get("/heatmap")
+async def get_heatmap(
+    start: Optional[datetime.datetime] = Query(None, alias="from"),
+    end: Optional[datetime.datetime] = Query(None, alias="to"),
+    res: int = 10,
+    space: str = "camera",
+    camera: Optional[str] = None,
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Occupancy heatmap (mean detections per frame per cell) from precomputed grids.
+    Without from/to: the live, decaying grid. space=map uses floor plan coordinates.
+    res = cells per side, must divide HEATMAP_GRID.
+    """
+    if res <= 0 or HEATMAP_GRID % res:
+        raise HTTPException(status_code=400, detail=f"res must divide {HEATMAP_GRID}")
+    if space not in ("camera", "map"):
+        raise HTTPException(status_code=400, detail="space must be 'camera' or 'map'")
+    key = MAP_KEY if space == "map" else (camera or state.primary_camera or "cam0")
+
+    if start is None and end is None:
+        grid = heatmaps.live_grid(key)
+        if grid is None:
+            grid = np.zeros((HEATMAP_GRID, HEATMAP_GRID), dtype=np.float32)
+        return {"space": space, "key": key, "live": True, "res": res, "grid": downsample(grid, res).round(4).tolist()}
+
+    utc = datetime.timezone.utc
+    end = end or datetime.datetime.now(utc)
+    start = start or end - datetime.timedelta(hours=1)
+    end = end if end.tzinfo else end.replace(tzinfo=utc)
+    start = start if start.tzinfo else start.replace(tzinfo=utc)
+    resolution = "minute" if end - start <= HEATMAP_MINUTE_RANGE else "hour"
+
+    total, samples = await load_range(db, key, resolution, start, end, HEATMAP_GRID)
+    # Buckets still in memory (current bucket, or waiting for the writer)
+    for bucket_start, grid, count in heatmaps.pending(key, resolution):
+        if start.timestamp() <= bucket_start < end.timestamp():
+            total += grid
+            samples += count
+
+    mean = total / samples if samples else total
+    return {
+        "space": space,
+        "key": key,
+        "live": False,
+        "from": start,
+        "to": end,
+        "resolution": resolution,
+        "samples": samples,
+        "res": res,
+        "grid": downsample(mean, res).round(4).tolist()
+    }
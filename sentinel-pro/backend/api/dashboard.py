@@ -1,33 +1,56 @@
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, HTTPException, Request
 from fastapi.responses import StreamingResponse
+from typing import Optional
 from engine.shared_state import state
 from backend.api.deps import get_db
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
-from backend.db.models import CrowdLog
-import time
+from backend.db.models import CrowdLog, CROWDLOG_SUMMARY_COLUMNS
+from backend.core.config import STREAM_TIERS, STREAM_DEFAULT_TIER
 import asyncio
 
 router = APIRouter()
 
-def generate_frames():
-    while True:
-        frame_bytes = state.get_frame()
-        if frame_bytes:
-            yield (b'--frame\r\n'
-                   b'Content-Type: image/jpeg\r\n\r\n' + frame_bytes + b'\r\n')
-        time.sleep(0.04) # ~25 FPS
+async def generate_frames(request: Request, channel, tier=STREAM_DEFAULT_TIER):
+    # Runs on the event loop: no threadpool worker is held per viewer
+    subscription = channel.subscribe()
+    try:
+        while not await request.is_disconnected():
+            # Wakes on a new frame from the vision engine; each frame is sent at most once
+            frame = await subscription.next(timeout=1.0)
+            if frame is None:
+                continue
+            # Each tier is encoded once per frame; only the first viewer pays for it (off the loop)
+            frame_bytes = frame.cached(tier)
+            if frame_bytes is None:
+                frame_bytes = await asyncio.to_thread(frame.jpeg, tier)
+            if frame_bytes:
+                yield (b'--frame\r\n'
+                       b'Content-Type: image/jpeg\r\n\r\n' + frame_bytes + b'\r\n')
+    finally:
+        subscription.close()
 
 @router.get("/vision/stream")
-def video_feed():
-    return StreamingResponse(generate_frames(), media_type="multipart/x-mixed-replace; boundary=frame")
+async def video_feed(request: Request, camera: Optional[str] = None, tier: str = STREAM_DEFAULT_TIER):
+    if tier not in STREAM_TIERS:
+        raise HTTPException(status_code=400, detail=f"Unknown tier '{tier}', expected one of {list(STREAM_TIERS)}")
+    channel = state.frame_channel(camera)
+    if channel is None:
+        raise HTTPException(status_code=404, detail=f"Unknown camera '{camera}', expected one of {list(state.camera_frames)}")
+    return StreamingResponse(generate_frames(request, channel, tier), media_type="multipart/x-mixed-replace; boundary=frame")
 
 @router.get("/status")
 def get_status():
     return state.get_snapshot()
 
+@router.get("/metrics")
+def get_engine_metrics():
+    """Engine health numbers (e.g. vision skip ratio, inference time)"""
+    return state.get_metrics()
+
 @router.get("/logs")
 async def get_logs(db: AsyncSession = Depends(get_db)):
-    result = await db.execute(select(CrowdLog).order_by(CrowdLog.timestamp.desc()).limit(50))
-    logs = result.scalars().all()
-    return logs
+    result = await db.execute(
+        select(*CROWDLOG_SUMMARY_COLUMNS).order_by(CrowdLog.timestamp.desc()).limit(50)
+    )
+    return [dict(row) for row in result.mappings()]
@@ -1,7 +1,7 @@
-import cv2
 import numpy as np
 import json
 from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import PlainTextResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
 from pydantic import BaseModel
@@ -9,7 +9,9 @@ from typing import List
 
 from backend.api.deps import get_db
 from backend.db.models import SystemConfig
-from backend.core.sentinel_hub import hub
+from backend.core import sentinel_hub
+from engine.shared_state import state
+from engine.instrumentation import metrics
 
 router = APIRouter()
 
@@ -30,7 +32,8 @@ async def calibrate_camera(data: CalibrationRequest, db: AsyncSession = Depends(
     src_pts = np.float32([[p.x, p.y] for p in data.camera_points]) # Camera
     dst_pts = np.float32([[p.x, p.y] for p in data.map_points])    # Map
 
-    # Compute Homography
+    # Compute Homography (cv2 imported here: only calibration needs it in the API process)
+    import cv2
     H, status = cv2.findHomography(src_pts, dst_pts)
     
     if H is None:
@@ -52,8 +55,10 @@ async def calibrate_camera(data: CalibrationRequest, db: AsyncSession = Depends(
     
     await db.commit()
 
-    # Update Runtime Engine
-    hub.update_homography_matrix(h_list)
+    # Update Runtime Engine (none in API_ONLY mode)
+    if sentinel_hub.hub is None:
+        return {"status": "success", "message": "Calibration saved, engines not running", "matrix": h_list}
+    sentinel_hub.hub.update_homography_matrix(h_list)
 
     return {"status": "success", "message": "Calibration saved and applied", "matrix": h_list}
 
@@ -62,3 +67,8 @@ async def get_config(db: AsyncSession = Depends(get_db)):
     result = await db.execute(select(SystemConfig))
     configs = result.scalars().all()
     return {c.key: c.value for c in configs}
+
+@router.get("/metrics", response_class=PlainTextResponse)
+def get_metrics():
+    """Stage latency histograms, error counters and engine gauges in Prometheus text format."""
+    return PlainTextResponse(metrics.render(state.get_metrics()), media_type="text/plain; version=0.0.4")
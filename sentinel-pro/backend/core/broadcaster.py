@@ -0,0 +1,145 @@
+import time
+import inspect
+from engine.shared_state import state
+from engine.instrumentation import metrics
+from backend.core.config import (
+    BROADCAST_CHANNELS, BROADCAST_RATES, BROADCAST_DEFAULT_ROOM, BROADCAST_KEYFRAME_SECONDS
+)
+
+# Fields that only exist on the full channel
+FULL_ONLY_FIELDS = ("coordinates", "generation")
+# Fields that move on every engine tick: they ride along with a delta but never trigger one
+# (real detection changes show up in "coordinates")
+PASSIVE_FIELDS = ("last_update", "generation")
+
+async def _maybe_await(result):
+    # enter_room/leave_room are plain calls on older python-socketio, coroutines on newer
+    if inspect.isawaitable(result):
+        await result
+
+class RoomState:
+    """What one room has been sent so far: clients in sync with it hold exactly `sent`."""
+
+    def __init__(self, channel, interval):
+        self.channel = channel
+        self.interval = interval # Min seconds between emits
+        self.members = set()
+        self.seq = 0
+        self.sent = {}
+        self.last_emit = 0.0
+        self.last_keyframe = 0.0
+
+class StateBroadcaster:
+    """
+    Socket.IO state fan-out by room ("<channel>:<rate>", see BROADCAST_CHANNELS/RATES).
+    Each room gets a full 'state_update' keyframe, then 'state_delta' messages that
+    carry only the fields that changed since the room's previous message, and nothing
+    at all while the state is unchanged. Every message has a per-room `seq`; a client
+    that sees a gap emits 'resync' and gets the room's current state back.
+    Coordinates travel as binary attachments (SharedState.get_snapshot("binary")).
+    """
+
+    def __init__(self, sio):
+        self.sio = sio
+        self.rooms = {} # room name -> RoomState
+        self.client_rooms = {} # sid -> room name
+        self.emitted = 0
+        self.skipped = 0 # Room ticks where nothing changed
+        sio.on('connect', self.on_connect)
+        sio.on('disconnect', self.on_disconnect)
+        sio.on('subscribe', self.on_subscribe)
+        sio.on('resync', self.on_resync)
+
+    def room(self, name):
+        room = self.rooms.get(name)
+        if room is None:
+            channel, _, rate = name.partition(":")
+            room = self.rooms[name] = RoomState(channel, BROADCAST_RATES[rate])
+        return room
+
+    async def join(self, sid, name):
+        previous = self.client_rooms.get(sid)
+        if previous is not None:
+            self.rooms[previous].members.discard(sid)
+            await _maybe_await(self.sio.leave_room(sid, previous))
+        room = self.room(name)
+        room.members.add(sid)
+        self.client_rooms[sid] = name
+        await _maybe_await(self.sio.enter_room(sid, name))
+        await self.send_current(sid, room)
+
+    async def send_current(self, sid, room):
+        """Bring one client in line with its room (join or resync)."""
+        if room.sent:
+            await self.sio.emit('state_update', {"seq": room.seq, **room.sent}, to=sid)
+        else:
+            room.last_keyframe = 0.0 # Room never emitted: keyframe for everybody on the next tick
+
+    async def on_connect(self, sid, environ, auth=None):
+        await self.join(sid, BROADCAST_DEFAULT_ROOM)
+
+    async def on_disconnect(self, sid):
+        name = self.client_rooms.pop(sid, None)
+        if name is not None:
+            self.rooms[name].members.discard(sid)
+
+    async def on_subscribe(self, sid, data):
+        """data: {"channel": "full" | "summary", "rate": "realtime" | "normal" | "slow"}"""
+        data = data or {}
+        channel = data.get("channel", "full")
+        rate = data.get("rate", "realtime")
+        if channel not in BROADCAST_CHANNELS or rate not in BROADCAST_RATES:
+            return {"error": f"channels: {list(BROADCAST_CHANNELS)}, rates: {list(BROADCAST_RATES)}"}
+        name = f"{channel}:{rate}"
+        await self.join(sid, name)
+        return {"room": name}
+
+    async def on_resync(self, sid, data=None):
+        name = self.client_rooms.get(sid)
+        if name is not None:
+            await self.send_current(sid, self.rooms[name])
+
+    @staticmethod
+    def view(snapshot, channel):
+        if channel == "full":
+            return snapshot
+        return {k: v for k, v in snapshot.items() if k not in FULL_ONLY_FIELDS}
+
+    async def publish(self, snapshot):
+        """Called once per hub tick with the fused snapshot (binary coordinates)."""
+        now = time.monotonic()
+        # Copy: clients can join new rooms while an emit below yields
+        for name, room in list(self.rooms.items()):
+            if not room.members or now - room.last_emit < room.interval:
+                continue
+            view = self.view(snapshot, room.channel)
+
+            if now - room.last_keyframe >= BROADCAST_KEYFRAME_SECONDS:
+                room.seq += 1
+                room.sent = dict(view)
+                room.last_keyframe = room.last_emit = now
+                with metrics.time("socket_emit"):
+                    await self.sio.emit('state_update', {"seq": room.seq, **view}, room=name)
+                self.emitted += 1
+                continue
+
+            delta = {
+                k: v for k, v in view.items()
+                if k not in PASSIVE_FIELDS and room.sent.get(k) != v
+            }
+            if not delta:
+                self.skipped += 1
+                continue
+            delta.update({k: view[k] for k in PASSIVE_FIELDS if k in view})
+            room.seq += 1
+            room.sent.update(delta)
+            room.last_emit = now
+            with metrics.time("socket_emit"):
+                await self.sio.emit('state_delta', {"seq": room.seq, **delta}, room=name)
+            self.emitted += 1
+
+        state.update_metrics("broadcast", {
+            "clients": len(self.client_rooms),
+            "emitted": self.emitted,
+            "skipped": self.skipped,
+        })
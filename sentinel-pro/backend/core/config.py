@@ -6,11 +6,34 @@ from dotenv import load_dotenv
 env_path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), ".env")
 load_dotenv(dotenv_path=env_path)
 
+# --- Startup ---
+# REST/analytics only: no engines, models, microphones, serial port or monitor loop
+API_ONLY = os.getenv("API_ONLY", "false").lower() == "true"
+
 # --- Vision Config ---
-YOLO_MODEL = "yolov8n-pose.pt"
+YOLO_MODEL = "yolov8n.pt" # Detection only: all the crowd pipeline needs
+YOLO_POSE_MODEL = "yolov8n-pose.pt" # Loaded only while a feature requests keypoints
+POSE_ENABLED = os.getenv("POSE_ENABLED", "false").lower() == "true" # Request pose from startup
 CONF_THRESHOLD = 0.25
 IOU_THRESHOLD = 0.45
 IMG_SIZE = 640
+# Inference runtime: auto | openvino | onnx | torch | tensorrt (auto benchmarks what is installed)
+INFERENCE_BACKEND = os.getenv("INFERENCE_BACKEND", "auto")
+
+# --- Frame Scheduling ---
+VISION_LATENCY_BUDGET_MS = 200 # Max interval between processed frames in a normal scene
+VISION_IDLE_BUDGET_MS = 1000 # Interval allowed once the scene is static
+VISION_ACTIVITY_DELTA = 2 # Count change between processed frames that marks the scene as active
+VISION_STATIC_FRAMES = 10 # Processed frames with an unchanged count before the scene is static
+
+# --- Stream Config ---
+# MJPEG tiers served by /vision/stream?tier=...: name -> (max width in px or None for native, JPEG quality)
+STREAM_TIERS = {
+    "full": (None, 85),
+    "medium": (960, 75),
+    "thumb": (320, 60),
+}
+STREAM_DEFAULT_TIER = "full"
 
 # --- Audio Config ---
 AUDIO_RATE = 22050
@@ -18,15 +41,64 @@ AUDIO_CHUNK = 1024
 AUDIO_BUFFER_SECONDS = 1.0
 RMS_THRESHOLD = 0.05
 SPECTRAL_CENTROID_THRESHOLD = 2000.0
-PANIC_PERSISTENCE = 3
+PANIC_PERSISTENCE = 3 # Consecutive panic hops before reporting PANIC
+AUDIO_HOP_SECONDS = 0.05 # Analysis rate, independent of capture
+AUDIO_QUEUE_CHUNKS = 64 # Captured chunks buffered for analysis before the oldest are dropped
+AUDIO_N_MFCC = 13 # Classifier features: mean/std of this many MFCCs + RMS + centroid
+AUDIO_ML_BATCH_HOPS = 4 # Hops per predict_proba call (adds up to this many hops of latency)
+AUDIO_ML_THRESHOLD = 0.5 # Panic probability for a hop to count as panic
+# Microphones as comma separated zone=device[:channel] (device = PyAudio index or "default"),
+# e.g. "cam0=default:0,cam1=default:1,cam2=3". Zones named after camera ids are fused with
+# that camera's crowd risk; empty = one mono input on the default device (AUDIO_GLOBAL_ZONE).
+AUDIO_INPUTS = os.getenv("AUDIO_INPUTS", "")
+AUDIO_GLOBAL_ZONE = "main" # Zone that applies to every camera
+
+# --- Replay Config ---
+# Video files in CAMERA_SOURCE and AUDIO_REPLAY_FILE are replayed instead of live capture.
+# Pacing: realtime (native rate) | fast (as fast as analysis keeps up, no drops) | step (engine.step())
+REPLAY_PACING = os.getenv("REPLAY_PACING", "realtime")
+REPLAY_LOOP = os.getenv("REPLAY_LOOP", "false").lower() == "true" # Restart files at end instead of finishing
+AUDIO_REPLAY_FILE = os.getenv("AUDIO_REPLAY_FILE", "") # WAV file replacing the microphones
+AUDIO_REPLAY_ZONES = os.getenv("AUDIO_REPLAY_ZONES", AUDIO_GLOBAL_ZONE) # Zone per WAV channel, comma separated
 
 # --- Crowd Density Config ---
 CROWD_DENSITY_HIGH = 5
 CROWD_DENSITY_MEDIUM = 3
 
+# --- Heatmap Config ---
+HEATMAP_GRID = 40 # Cells per side of accumulated grids; queries can downsample to any divisor
+HEATMAP_HALF_LIFE_SECONDS = 30.0 # Decay of the live occupancy grid
+HEATMAP_MAP_BOUNDS = (0.0, 0.0, 1.0, 1.0) # Floor plan extent (min_x, min_y, max_x, max_y) of map_x/map_y
+HEATMAP_RESOLUTIONS = {"minute": 60, "hour": 3600} # Time buckets kept per grid (name -> seconds)
+HEATMAP_PENDING_BUCKETS = 1000 # Completed buckets held in memory while waiting for the DB
+
+# --- Broadcast Config ---
+# Socket.IO state rooms are "<channel>:<rate>". full = everything incl. binary coordinates,
+# summary = counts/risk only. Rate = min seconds between emits to that room (0 = every change).
+BROADCAST_CHANNELS = ("full", "summary")
+BROADCAST_RATES = {"realtime": 0.0, "normal": 1.0, "slow": 5.0}
+BROADCAST_DEFAULT_ROOM = "full:realtime" # Joined on connect until the client subscribes
+BROADCAST_KEYFRAME_SECONDS = 30.0 # Full state re-sent this often so missed deltas heal
+
+# --- Monitor Config ---
+MONITOR_HEARTBEAT_SECONDS = 5.0 # Hub tick without any state change
+MONITOR_MIN_INTERVAL = 0.1 # Minimum spacing between hub ticks, coalesces bursts of engine updates
+
+# --- Crowd Log Config ---
+CROWDLOG_INTERVAL_SECONDS = float(os.getenv("CROWDLOG_INTERVAL_SECONDS", "1.0")) # Sample rate of crowd_logs rows
+CROWDLOG_BATCH_SIZE = 200 # Rows per multi-row INSERT
+CROWDLOG_FLUSH_SECONDS = 5.0 # Flush at least this often even if the batch isn't full
+CROWDLOG_QUEUE_SIZE = 10000 # Rows buffered in memory while the DB is slow or down
+CROWDLOG_DROP_POLICY = "oldest" # When the buffer is full: drop "oldest" queued rows or the "newest" sample
+CROWDLOG_RETRY_MAX_SECONDS = 30.0 # Backoff cap between failed flushes
+CROWDLOG_RETENTION_DAYS = int(os.getenv("CROWDLOG_RETENTION_DAYS", "90")) # Monthly partitions older than this are dropped
+CROWDLOG_MAINTENANCE_SECONDS = 6 * 3600 # How often partitions are created ahead / expired
+
 # --- Hardware Config ---
 ARDUINO_PORT = "COM3"
 ARDUINO_BAUD = 9600
+ARDUINO_RESET_SECONDS = 2.0 # Opening the port resets the board; commands sent before it boots are lost
+ARDUINO_RECONNECT_MAX_SECONDS = 30.0 # Cap of the exponential backoff between reconnect attempts
 
 # --- Paths ---
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,165 @@
+import asyncio
+import collections
+import datetime
+from sqlalchemy import insert
+from backend.api.deps import AsyncSessionLocal
+from backend.db.models import CrowdLog
+from backend.db.rollups import apply_rollups
+from backend.db.heatmaps import persist_buckets
+from backend.core.config import (
+    CROWDLOG_BATCH_SIZE, CROWDLOG_FLUSH_SECONDS, CROWDLOG_QUEUE_SIZE,
+    CROWDLOG_DROP_POLICY, CROWDLOG_RETRY_MAX_SECONDS
+)
+from engine.shared_state import state
+from engine.instrumentation import metrics
+from engine.vision.heatmap import heatmaps
+
+class CrowdLogWriter:
+    """
+    Background writer for crowd_logs.
+    The monitor loop only appends rows to a bounded in-memory queue and never waits
+    on Postgres. A separate task flushes them with one multi-row INSERT per batch,
+    when CROWDLOG_BATCH_SIZE rows are waiting or every CROWDLOG_FLUSH_SECONDS, and
+    folds the same batch into the per-minute and per-hour rollup tables.
+    If the DB is slow or down, failed batches go back to the queue, flushes back off
+    exponentially, and once the queue is full CROWDLOG_DROP_POLICY picks what is lost.
+    Completed heatmap buckets (engine.vision.heatmap) are persisted on the same schedule.
+    """
+
+    def __init__(self, batch_size=CROWDLOG_BATCH_SIZE, flush_seconds=CROWDLOG_FLUSH_SECONDS,
+                 max_queue=CROWDLOG_QUEUE_SIZE, drop_policy=CROWDLOG_DROP_POLICY):
+        self.batch_size = batch_size
+        self.flush_seconds = flush_seconds
+        self.max_queue = max_queue
+        self.drop_policy = drop_policy
+        self.queue = collections.deque()
+        self.written = 0
+        self.dropped = 0
+        self.failed_flushes = 0
+        self.running = False
+        self.task = None
+        self._wake = None # asyncio.Event, created on the serving loop in start()
+        self._failures = 0 # Consecutive failed flushes, drives the backoff
+
+    def enqueue(self, person_count, risk_score, zone_id, coordinates=None):
+        """Queue one row (timestamped now). Never blocks; returns False if the row was dropped."""
+        if len(self.queue) >= self.max_queue:
+            self.dropped += 1
+            metrics.increment("crowdlog_dropped")
+            if self.drop_policy == "newest":
+                return False
+            self.queue.popleft()
+
+        self.queue.append({
+            # Sample time, not flush time (server_default would stamp the INSERT)
+            "timestamp": datetime.datetime.now(datetime.timezone.utc),
+            "person_count": person_count,
+            "risk_score": risk_score,
+            "zone_id": zone_id,
+            "coordinates": coordinates,
+        })
+        if self._wake is not None and len(self.queue) >= self.batch_size:
+            self._wake.set()
+        return True
+
+    def requeue(self, batch):
+        """Put a failed batch back in front of the queue, as far as the bound allows."""
+        room = self.max_queue - len(self.queue)
+        if room < len(batch):
+            lost = len(batch) - room
+            self.dropped += lost
+            metrics.increment("crowdlog_dropped", lost)
+            # The batch is the oldest data we hold: "oldest" drops its head, "newest" its tail
+            batch = batch[lost:] if self.drop_policy == "oldest" else batch[:room]
+        self.queue.extendleft(reversed(batch))
+
+    async def flush(self):
+        """Write up to batch_size queued rows in one INSERT. Returns rows written (0 on failure)."""
+        if not self.queue:
+            return 0
+        batch = [self.queue.popleft() for _ in range(min(self.batch_size, len(self.queue)))]
+        try:
+            with metrics.time("db_write"):
+                async with AsyncSessionLocal() as session:
+                    # One multi-row INSERT ... VALUES statement (passing rows as a second
+                    # argument would be a DBAPI executemany with asyncpg)
+                    await session.execute(insert(CrowdLog).values(batch))
+                    # Minute/hour rollups in the same transaction, so a failed batch counts nowhere
+                    await apply_rollups(session, batch)
+                    await session.commit()
+        except Exception as e:
+            self.failed_flushes += 1
+            self._failures += 1
+            metrics.increment("crowdlog_flush_errors")
+            self.requeue(batch)
+            print(f"[LogWriter] Flush of {len(batch)} rows failed ({e}), {len(self.queue)} queued")
+            return 0
+        self._failures = 0
+        self.written += len(batch)
+        return len(batch)
+
+    async def flush_heatmaps(self, include_open=False):
+        """Persist completed heatmap buckets. Returns False if the write failed."""
+        items = heatmaps.pop_completed(include_open)
+        if not items:
+            return True
+        try:
+            with metrics.time("db_write"):
+                async with AsyncSessionLocal() as session:
+                    await persist_buckets(session, items)
+                    await session.commit()
+        except Exception as e:
+            metrics.increment("heatmap_flush_errors")
+            lost = heatmaps.requeue(items) # Back to the (bounded) pending queue
+            print(f"[LogWriter] Heatmap flush of {len(items)} buckets failed ({e}), {lost} dropped")
+            return False
+        return True
+
+    def publish_metrics(self):
+        state.update_metrics("crowdlog", {
+            "queued": len(self.queue),
+            "written": self.written,
+            "dropped": self.dropped,
+            "failed_flushes": self.failed_flushes,
+        })
+
+    async def run(self):
+        while self.running:
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=self.flush_seconds)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+
+            # Drain in batch-sized INSERTs; stop at the first failure and back off
+            while self.queue and await self.flush():
+                pass
+            if not await self.flush_heatmaps():
+                self._failures = max(self._failures, 1)
+            self.publish_metrics()
+
+            if self._failures:
+                backoff = min(self.flush_seconds * 2 ** (self._failures - 1), CROWDLOG_RETRY_MAX_SECONDS)
+                await asyncio.sleep(backoff)
+
+    def start(self):
+        """Start the flush task on the running event loop."""
+        self.running = True
+        self._wake = asyncio.Event()
+        self.task = asyncio.create_task(self.run())
+
+    async def stop(self, timeout=5.0):
+        """Stop the flush task and make one last attempt to write what is queued."""
+        self.running = False
+        if self.task is None:
+            return
+        self._wake.set()
+        try:
+            await asyncio.wait_for(self.task, timeout=timeout)
+        except (asyncio.TimeoutError, asyncio.CancelledError):
+            pass
+        while self.queue and await self.flush():
+            pass
+        await self.flush_heatmaps(include_open=True)
+        if self.queue:
+            print(f"[LogWriter] {len(self.queue)} rows not written at shutdown")
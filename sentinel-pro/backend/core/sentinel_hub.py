@@ -1,28 +1,92 @@
-import socketio
 import asyncio
 import time
-import json
 from engine.shared_state import state
-from .serial_bridge import ArduinoBridge
-from backend.api.deps import AsyncSessionLocal
-from backend.db.models import CrowdLog
+from .log_writer import CrowdLogWriter
+from .broadcaster import StateBroadcaster
+from backend.core.config import (
+    AUDIO_GLOBAL_ZONE, CROWDLOG_INTERVAL_SECONDS, MONITOR_HEARTBEAT_SECONDS, MONITOR_MIN_INTERVAL
+)
+
+# Ordering of fused risk levels
+FUSED_ORDER = {"SAFE": 0, "WARN": 1, "DANGER": 2}
+
+def fuse_risk(crowd_risk, audio_status):
+    if audio_status == "PANIC" and crowd_risk == "HIGH":
+        return "DANGER"
+    elif audio_status == "PANIC" or crowd_risk == "HIGH":
+        return "WARN"
+    elif crowd_risk == "MEDIUM":
+        return "WARN"
+    return "SAFE"
+
+def fuse_zones(snapshot):
+    """
+    Fuse crowd and audio risk. A camera only escalates to DANGER when the panic is heard
+    in its own zone (zone named after the camera) or in the global zone; the venue risk
+    is the worst camera.
+    """
+    zones = snapshot.get('audio_zones') or {}
+    cameras = snapshot.get('cameras') or {}
+    if not cameras:
+        return fuse_risk(snapshot['risk_level'], snapshot['audio_status'])
+
+    global_panic = zones.get(AUDIO_GLOBAL_ZONE) == "PANIC"
+    risks = [
+        fuse_risk(cam['risk_level'], "PANIC" if global_panic or zones.get(camera_id) == "PANIC" else "NORMAL")
+        for camera_id, cam in cameras.items()
+    ]
+    # Panic in a zone with no camera still warns
+    if snapshot['audio_status'] == "PANIC":
+        risks.append("WARN")
+    return max(risks, key=FUSED_ORDER.get)
 
 class SentinelHub:
-    def __init__(self):
-        self.sio = socketio.AsyncServer(async_mode='asgi', cors_allowed_origins='*')
-        self.app = socketio.ASGIApp(self.sio)
-        self.arduino = ArduinoBridge()
+    """
+    Owns the engines, the Arduino bridge and the monitor loop. Built by the app lifespan
+    (create_hub), never at import; constructing it is cheap, the engines are loaded
+    later by startup() on a worker thread while the API already serves.
+    """
+
+    def __init__(self, sio):
+        self.sio = sio
+        self.broadcaster = StateBroadcaster(self.sio) # Per-room deltas, only on change
+        self.arduino = None
+        self.last_heartbeat = 0.0
+        self.log_writer = CrowdLogWriter() # DB writes happen off the broadcast loop
         self.last_log_time = time.time()
-        
-        # Engines (Lazy loaded or init here)
+        self.vision_engine = None
+        self.audio_engine = None
+        self.homography = None # Calibration received before the vision engine was loaded
+
+    def load_engines(self):
+        """Import and build the engines and the bridge (models, cv2, pyaudio, pyserial). Blocking."""
         from engine.vision.vision_module import VisionEngine
         from engine.audio.audio_module import AudioEngine
-        
+        from .serial_bridge import ArduinoBridge
+
+        self.arduino = ArduinoBridge() # Writer thread, connects in the background
         self.vision_engine = VisionEngine(source=None) # Use env var or default to 0
         self.audio_engine = AudioEngine()
+        if self.homography is not None:
+            self.vision_engine.set_homography(self.homography)
+
+    async def startup(self):
+        """Load the engines off the event loop, start them, then run the monitor loop."""
+        started = time.time()
+        try:
+            await asyncio.to_thread(self.load_engines)
+        except Exception as e:
+            # The API keeps serving; live state just stays empty
+            print(f"[Hub] Failed to load engines: {e}")
+            return
+        print(f"[Hub] Engines loaded in {time.time() - started:.1f}s")
+        self.start_engines()
+        await self.monitor_loop()
 
     def start_engines(self):
         print("[Hub] Starting Engines...")
+        if not self.arduino.is_alive():
+            self.arduino.start()
         if not self.vision_engine.is_alive():
             self.vision_engine.start()
         if not self.audio_engine.is_alive():
@@ -30,64 +94,78 @@ class SentinelHub:
 
     def stop_engines(self):
         print("[Hub] Stopping Engines...")
-        if self.vision_engine:
+        if self.vision_engine and self.vision_engine.is_alive(): # Not started if shut down while loading
             self.vision_engine.stop()
             self.vision_engine.join()
-        if self.audio_engine:
+        if self.audio_engine and self.audio_engine.is_alive():
             self.audio_engine.stop()
             self.audio_engine.join()
+        if self.arduino and self.arduino.is_alive():
+            self.arduino.stop()
+            self.arduino.join(timeout=2.0)
 
     def update_homography_matrix(self, matrix):
         """Update vision engine with new homography matrix"""
+        self.homography = matrix
         if self.vision_engine:
             self.vision_engine.set_homography(matrix)
             print("[Hub] Homography updated in Vision Engine")
 
     async def monitor_loop(self):
         print("[Hub] Monitor Loop Started")
+        # Woken by the engines on change (vision results, audio transitions), a heartbeat
+        # and the crowd log sample clock; nothing runs while idle in between
+        changes = state.changes.subscribe()
         while True:
-            snapshot = state.get_snapshot()
-            
-            # Anomaly Alert Logic (Compare current vs 5-min average)
-            # This is a simplified version; real logic would query DB for average
-            # For now, we compare against a static threshold or a simple running average if we had one.
-            # Let's assume an "Anomaly" if count jumps by > 5 in 1 second (burst) - simpler for now without DB queries in loop
-            
-            # Risk Logic
-            crowd_risk = snapshot['risk_level'] 
-            audio_status = snapshot['audio_status'] 
-            
-            final_risk = "SAFE"
-            if audio_status == "PANIC" and crowd_risk == "HIGH":
-                final_risk = "DANGER"
-            elif audio_status == "PANIC" or crowd_risk == "HIGH":
-                final_risk = "WARN"
-            elif crowd_risk == "MEDIUM":
-                final_risk = "WARN"
-            else:
-                final_risk = "SAFE"
-            
-            snapshot['risk_level'] = final_risk
-            
-            # Broadcast
-            await self.sio.emit('state_update', snapshot)
-            
-            # Log to DB every 5 seconds
-            if time.time() - self.last_log_time > 5:
-                self.last_log_time = time.time()
-                async with AsyncSessionLocal() as session:
-                    log = CrowdLog(
-                        person_count=snapshot['people_count'],
-                        risk_score=final_risk,
-                        zone_id="main",
-                        coordinates=json.dumps(snapshot.get('coordinates', []))
-                    )
-                    session.add(log)
-                    await session.commit()
-            
-            # Hardware (Non-blocking)
-            await asyncio.to_thread(self.arduino.send_command, f"RISK:{final_risk}")
-            
-            await asyncio.sleep(0.5)
-
-hub = SentinelHub()
+            try:
+                await self.tick()
+            except Exception as e:
+                # One bad tick must not end broadcasts, crowd logging and the Arduino updates
+                print(f"[Hub] Monitor tick failed: {e!r}")
+
+            # Coalesce bursts, then sleep until a change, the heartbeat or the next log sample
+            await asyncio.sleep(MONITOR_MIN_INTERVAL)
+            next_log = self.last_log_time + CROWDLOG_INTERVAL_SECONDS - time.time()
+            next_heartbeat = self.last_heartbeat + MONITOR_HEARTBEAT_SECONDS - time.monotonic()
+            await changes.wait(timeout=max(0.0, min(next_log, next_heartbeat)))
+
+    async def tick(self):
+        """One monitor pass: fuse risk, broadcast, queue a crowd log sample, update the Arduino."""
+        now = time.monotonic()
+        if now - self.last_heartbeat >= MONITOR_HEARTBEAT_SECONDS:
+            self.last_heartbeat = now
+
+        snapshot = state.get_snapshot(coordinates="binary")
+        
+        # Anomaly Alert Logic (Compare current vs 5-min average)
+        # This is a simplified version; real logic would query DB for average
+        # For now, we compare against a static threshold or a simple running average if we had one.
+        # Let's assume an "Anomaly" if count jumps by > 5 in 1 second (burst) - simpler for now without DB queries in loop
+        
+        # Risk Logic (per camera zone when microphones are mapped to cameras)
+        final_risk = fuse_zones(snapshot)
+        
+        snapshot['risk_level'] = final_risk
+        
+        # Broadcast (skipped for rooms whose state didn't change)
+        await self.broadcaster.publish(snapshot)
+        
+        # Log to DB (queued, flushed in batches by the log writer)
+        if time.time() - self.last_log_time >= CROWDLOG_INTERVAL_SECONDS:
+            self.last_log_time = time.time()
+            self.log_writer.enqueue(
+                person_count=snapshot['people_count'],
+                risk_score=final_risk,
+                zone_id="main",
+                coordinates=state.get_coordinates_packed() # Cached per detection generation
+            )
+        
+        # Hardware (Non-blocking), the bridge only writes risk transitions
+        self.arduino.send_command(f"RISK:{final_risk}")
+
+hub = None # The running hub, set by create_hub(); stays None in API_ONLY mode
+
+def create_hub(sio):
+    global hub
+    hub = SentinelHub(sio)
+    return hub
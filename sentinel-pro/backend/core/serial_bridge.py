@@ -1,41 +1,124 @@
 import serial
-import time
 import threading
-from .config import ARDUINO_PORT, ARDUINO_BAUD
+from .config import ARDUINO_PORT, ARDUINO_BAUD, ARDUINO_RESET_SECONDS, ARDUINO_RECONNECT_MAX_SECONDS
+from engine.shared_state import state
+from engine.instrumentation import metrics
 
-class ArduinoBridge:
-    def __init__(self, port=ARDUINO_PORT, baud=ARDUINO_BAUD):
+class ArduinoBridge(threading.Thread):
+    """
+    Serial link to the alert Arduino, owned by one writer thread.
+    send_command() only records what the device should be showing and returns at once;
+    the writer thread writes it when it differs from what the device last received, so
+    the same risk level requested on every hub tick never reaches the wire twice, and a
+    burst of changes collapses into the latest one.
+    Opening the port (and waiting out the board reset) also happens on the writer thread.
+    A missing or unplugged device is retried with exponential backoff up to
+    ARDUINO_RECONNECT_MAX_SECONDS, and the current command is re-sent after each reconnect.
+    """
+
+    def __init__(self, port=ARDUINO_PORT, baud=ARDUINO_BAUD, reset_seconds=ARDUINO_RESET_SECONDS):
+        super().__init__(daemon=True)
         self.port = port
         self.baud = baud
+        self.reset_seconds = reset_seconds
         self.serial_conn = None
         self.connected = False
-        self.lock = threading.Lock()
-        
-        self.connect()
+        self.running = False
+        self.pending = None # Latest command requested
+        self.sent = None # Last command the device received on the current connection
+        self.writes = 0
+        self.coalesced = 0 # Requests that never had to be written
+        self.reconnects = 0
+        self._wake = threading.Condition()
+        self._stopped = threading.Event()
+        self._failures = 0 # Consecutive failed connects/writes, drives the backoff
+
+    def send_command(self, command: str):
+        """Request a command (e.g. "RISK:WARN"). Never blocks."""
+        with self._wake:
+            if command == self.pending:
+                self.coalesced += 1
+                return
+            self.pending = command
+            self._wake.notify()
 
     def connect(self):
         try:
             self.serial_conn = serial.Serial(self.port, self.baud, timeout=1, write_timeout=0.1)
-            time.sleep(2) # Wait for Arduino reboot
-            self.connected = True
-            print(f"[Serial] Connected to Arduino at {self.port}")
         except Exception as e:
-            print(f"[Serial] Failed to connect to {self.port}: {e}")
-            self.connected = False
+            self._failures += 1
+            print(f"[Serial] Failed to connect to {self.port}: {e} (retry in {self.backoff():.0f}s)")
+            return False
+        self._stopped.wait(self.reset_seconds) # Wait for Arduino reboot
+        self.connected = True
+        self.reconnects += 1
+        with self._wake:
+            self.sent = None # Fresh board: whatever is pending goes out again
+        print(f"[Serial] Connected to Arduino at {self.port}")
+        return True
 
-    def send_command(self, command: str):
-        if not self.connected:
-            return
-        
-        with self.lock:
-            try:
-                # Command format: "RISK:HIGH\n"
-                msg = f"{command}\n"
-                self.serial_conn.write(msg.encode('utf-8'))
-            except Exception as e:
-                print(f"[Serial] Send Error: {e}")
-                self.connected = False
+    def backoff(self):
+        return min(2 ** max(self._failures - 1, 0), ARDUINO_RECONNECT_MAX_SECONDS)
+
+    def write(self, command):
+        try:
+            # Command format: "RISK:HIGH\n"
+            with metrics.time("serial_write"):
+                self.serial_conn.write(f"{command}\n".encode('utf-8'))
+        except Exception as e:
+            self._failures += 1
+            metrics.increment("serial_errors")
+            print(f"[Serial] Send Error: {e}, reconnecting in {self.backoff():.0f}s")
+            self.close()
+            return False
+        self._failures = 0
+        self.writes += 1
+        with self._wake:
+            self.sent = command
+        return True
+
+    def publish_metrics(self):
+        state.update_metrics("serial", {
+            "connected": self.connected,
+            "writes": self.writes,
+            "coalesced": self.coalesced,
+            "reconnects": self.reconnects,
+        })
+
+    def run(self):
+        self.running = True
+        print(f"[Serial] Writer started for {self.port}")
+        while self.running:
+            if not self.connected:
+                if not self.connect():
+                    self.publish_metrics()
+                    self._stopped.wait(self.backoff())
+                    continue
+                self.publish_metrics()
+
+            with self._wake:
+                while self.running and self.pending == self.sent:
+                    self._wake.wait()
+                command = self.pending
+            if not self.running:
+                break
+
+            if not self.write(command):
+                self._stopped.wait(self.backoff())
+            self.publish_metrics()
+        self.close()
+
+    def stop(self):
+        self.running = False
+        self._stopped.set()
+        with self._wake:
+            self._wake.notify_all()
 
     def close(self):
+        self.connected = False
         if self.serial_conn:
-            self.serial_conn.close()
+            try:
+                self.serial_conn.close()
+            except Exception:
+                pass
+            self.serial_conn = None
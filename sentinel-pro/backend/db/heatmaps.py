@@ -0,0 +1,68 @@
+import datetime
+import numpy as np
+from sqlalchemy import select, tuple_
+from sqlalchemy.dialects.postgresql import insert
+from backend.db.models import HeatmapGrid
+
+def to_datetime(epoch):
+    return datetime.datetime.fromtimestamp(epoch, tz=datetime.timezone.utc)
+
+async def persist_buckets(session, items):
+    """
+    Write completed accumulator buckets [(key, resolution, start, grid, samples)].
+    A bucket can arrive twice (flushed at shutdown, continued after restart):
+    existing rows are read in one query and summed before the upsert.
+    """
+    if not items:
+        return
+    rows = {}
+    for key, resolution, start, grid, samples in items:
+        pk = (key, resolution, to_datetime(start))
+        if pk in rows:
+            rows[pk]["grid"] = rows[pk]["grid"] + grid
+            rows[pk]["samples"] += samples
+        else:
+            rows[pk] = {"grid": grid, "samples": samples}
+
+    existing = await session.execute(
+        select(HeatmapGrid).where(
+            tuple_(HeatmapGrid.grid_key, HeatmapGrid.resolution, HeatmapGrid.bucket).in_(list(rows))
+        )
+    )
+    for row in existing.scalars():
+        pk = (row.grid_key, row.resolution, row.bucket)
+        if pk in rows and row.size == rows[pk]["grid"].shape[0]:
+            rows[pk]["grid"] = rows[pk]["grid"] + np.frombuffer(row.cells, dtype=np.float32).reshape(row.size, row.size)
+            rows[pk]["samples"] += row.samples
+
+    stmt = insert(HeatmapGrid).values([
+        {
+            "grid_key": key, "resolution": resolution, "bucket": bucket,
+            "size": row["grid"].shape[0], "samples": row["samples"],
+            "cells": np.ascontiguousarray(row["grid"], dtype=np.float32).tobytes(),
+        }
+        for (key, resolution, bucket), row in rows.items()
+    ])
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[HeatmapGrid.grid_key, HeatmapGrid.resolution, HeatmapGrid.bucket],
+        set_={"size": stmt.excluded.size, "samples": stmt.excluded.samples, "cells": stmt.excluded.cells}
+    )
+    await session.execute(stmt)
+
+async def load_range(session, key, resolution, start, end, size):
+    """Sum of stored grids for key in [start, end): (grid, samples)."""
+    result = await session.execute(
+        select(HeatmapGrid.cells, HeatmapGrid.samples).where(
+            HeatmapGrid.grid_key == key,
+            HeatmapGrid.resolution == resolution,
+            HeatmapGrid.bucket >= start,
+            HeatmapGrid.bucket < end,
+            HeatmapGrid.size == size,
+        )
+    )
+    total = np.zeros((size, size), dtype=np.float64)
+    samples = 0
+    for cells, count in result:
+        total += np.frombuffer(cells, dtype=np.float32).reshape(size, size)
+        samples += count
+    return total, samples
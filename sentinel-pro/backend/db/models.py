@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey, Boolean
+from sqlalchemy import Column, Integer, BigInteger, String, Float, DateTime, Boolean, LargeBinary, Index
 from sqlalchemy.orm import declarative_base, relationship
 from sqlalchemy.sql import func
 
@@ -15,30 +15,87 @@ class User(Base):
     created_at = Column(DateTime(timezone=True), server_default=func.now())
 
 class CrowdLog(Base):
-    """High frequency logs from AI engine"""
+    """
+    High frequency logs from AI engine.
+    Range-partitioned by month on timestamp (see migration 7b3e9a1d2c4f and
+    backend/db/partitions.py), so the partition key is part of the primary key.
+    """
     __tablename__ = "crowd_logs"
+    __table_args__ = (
+        Index("ix_crowd_logs_zone_timestamp", "zone_id", "timestamp"),
+        Index("ix_crowd_logs_timestamp_brin", "timestamp", postgresql_using="brin"),
+        {"postgresql_partition_by": "RANGE (timestamp)"},
+    )
 
-    id = Column(Integer, primary_key=True, index=True)
-    timestamp = Column(DateTime(timezone=True), server_default=func.now())
+    id = Column(BigInteger, primary_key=True, autoincrement=True)
+    timestamp = Column(DateTime(timezone=True), primary_key=True, server_default=func.now())
     person_count = Column(Integer, default=0)
     risk_score = Column(String, default="LOW")
     zone_id = Column(String, default="default")
-    coordinates = Column(String, nullable=True) # JSON string of coordinates
+    coordinates = Column(LargeBinary, nullable=True) # Packed COORD_DTYPE rows (engine.shared_state.pack_coordinates)
+
+    incidents = relationship(
+        "Incident", back_populates="crowd_log",
+        primaryjoin="CrowdLog.id == foreign(Incident.crowd_log_id)"
+    )
+
+class CrowdRollup(Base):
+    """
+    Pre-aggregated person counts per zone and time bucket, maintained by the
+    crowd log writer in the same transaction as the raw rows (backend/db/rollups.py).
+    """
+    __abstract__ = True
+
+    zone_id = Column(String, primary_key=True)
+    bucket = Column(DateTime(timezone=True), primary_key=True) # Start of the minute / hour (UTC)
+    samples = Column(Integer, nullable=False, default=0) # Number of crowd_logs rows
+    total = Column(BigInteger, nullable=False, default=0) # Sum of person_count
+    min_count = Column(Integer, nullable=False)
+    max_count = Column(Integer, nullable=False)
+
+class CrowdRollupMinute(CrowdRollup):
+    __tablename__ = "crowd_rollup_minute"
+    __table_args__ = (Index("ix_crowd_rollup_minute_bucket", "bucket"),)
+
+class CrowdRollupHour(CrowdRollup):
+    __tablename__ = "crowd_rollup_hour"
+    __table_args__ = (Index("ix_crowd_rollup_hour_bucket", "bucket"),)
+
+class HeatmapGrid(Base):
+    """
+    Occupancy grid of one camera (normalized x/y) or the floor plan ("map") over one
+    time bucket, from engine/vision/heatmap.py. cells = float32 detection sums,
+    row-major size x size; samples = processed frames, so mean occupancy = cells / samples.
+    """
+    __tablename__ = "heatmap_grids"
+
+    grid_key = Column(String, primary_key=True) # Camera id or "map"
+    resolution = Column(String, primary_key=True) # "minute" | "hour"
+    bucket = Column(DateTime(timezone=True), primary_key=True)
+    size = Column(Integer, nullable=False)
+    samples = Column(Integer, nullable=False)
+    cells = Column(LargeBinary, nullable=False)
 
-    incidents = relationship("Incident", back_populates="crowd_log")
+# CrowdLog columns returned by list endpoints (coordinates are binary, see analytics heatmap)
+CROWDLOG_SUMMARY_COLUMNS = (
+    CrowdLog.id, CrowdLog.timestamp, CrowdLog.person_count, CrowdLog.risk_score, CrowdLog.zone_id
+)
 
 class Incident(Base):
     """Critical alerts (Level 1)"""
     __tablename__ = "incidents"
 
     id = Column(Integer, primary_key=True, index=True)
-    crowd_log_id = Column(Integer, ForeignKey("crowd_logs.id"))
+    crowd_log_id = Column(BigInteger, index=True) # No FK: crowd_logs is partitioned, id alone isn't unique there
     timestamp = Column(DateTime(timezone=True), server_default=func.now())
     alert_type = Column(String) # PANIC_AUDIO, HIGH_DENSITY, COMPOSITE
     details = Column(String)
     acknowledged = Column(Boolean, default=False)
 
-    crowd_log = relationship("CrowdLog", back_populates="incidents")
+    crowd_log = relationship(
+        "CrowdLog", back_populates="incidents",
+        primaryjoin="foreign(Incident.crowd_log_id) == CrowdLog.id"
+    )
 
 class SystemConfig(Base):
     """Dynamic configuration values"""
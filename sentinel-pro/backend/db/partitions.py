@@ -0,0 +1,45 @@
+"""
+Maintenance for the monthly crowd_logs partitions (migration 7b3e9a1d2c4f).
+Partitions are created a month ahead so rows never land in crowd_logs_default,
+and whole months older than CROWDLOG_RETENTION_DAYS are dropped (a DROP TABLE,
+no DELETE/VACUUM churn).
+"""
+import asyncio
+import datetime
+from sqlalchemy import text
+from backend.api.deps import AsyncSessionLocal
+from backend.core.config import CROWDLOG_RETENTION_DAYS, CROWDLOG_MAINTENANCE_SECONDS
+
+async def ensure_partitions(session, months_ahead=1):
+    """Create this month's partition and the next `months_ahead` ones if missing."""
+    await session.execute(text("""
+        SELECT crowd_logs_ensure_partition(month::date)
+        FROM generate_series(
+            date_trunc('month', now()),
+            date_trunc('month', now()) + make_interval(months => :ahead),
+            interval '1 month'
+        ) AS month
+    """), {"ahead": months_ahead})
+
+async def drop_expired_partitions(session, retention_days=CROWDLOG_RETENTION_DAYS):
+    """Drop monthly partitions that ended more than retention_days ago. Returns how many."""
+    cutoff = datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(days=retention_days)
+    result = await session.execute(text("SELECT crowd_logs_drop_partitions(:cutoff)"), {"cutoff": cutoff})
+    return result.scalar() or 0
+
+async def run_maintenance():
+    async with AsyncSessionLocal() as session:
+        await ensure_partitions(session)
+        dropped = await drop_expired_partitions(session)
+        await session.commit()
+    if dropped:
+        print(f"[Partitions] Dropped {dropped} crowd_logs partition(s) past {CROWDLOG_RETENTION_DAYS} days retention")
+
+async def maintenance_loop():
+    """Background task: partition upkeep at startup and every CROWDLOG_MAINTENANCE_SECONDS."""
+    while True:
+        try:
+            await run_maintenance()
+        except Exception as e:
+            print(f"[Partitions] Maintenance failed: {e}")
+        await asyncio.sleep(CROWDLOG_MAINTENANCE_SECONDS)
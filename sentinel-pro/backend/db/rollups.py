@@ -0,0 +1,50 @@
+from sqlalchemy import func
+from sqlalchemy.dialects.postgresql import insert
+from backend.db.models import CrowdRollupMinute, CrowdRollupHour
+
+# Rollup table -> how a timestamp is truncated to its bucket
+ROLLUPS = (
+    (CrowdRollupMinute, lambda ts: ts.replace(second=0, microsecond=0)),
+    (CrowdRollupHour, lambda ts: ts.replace(minute=0, second=0, microsecond=0)),
+)
+
+def aggregate(rows, truncate):
+    """Fold crowd_logs row dicts into {(zone_id, bucket): rollup values} in one pass."""
+    buckets = {}
+    for row in rows:
+        key = (row["zone_id"], truncate(row["timestamp"]))
+        count = row["person_count"]
+        agg = buckets.get(key)
+        if agg is None:
+            buckets[key] = {"samples": 1, "total": count, "min_count": count, "max_count": count}
+        else:
+            agg["samples"] += 1
+            agg["total"] += count
+            agg["min_count"] = min(agg["min_count"], count)
+            agg["max_count"] = max(agg["max_count"], count)
+    return buckets
+
+async def apply_rollups(session, rows):
+    """
+    Merge a batch of crowd_logs rows into every rollup table: one upsert per table,
+    with one VALUES row per touched (zone, bucket). Runs in the caller's transaction.
+    """
+    for model, truncate in ROLLUPS:
+        buckets = aggregate(rows, truncate)
+        if not buckets:
+            continue
+        stmt = insert(model).values([
+            {"zone_id": zone_id, "bucket": bucket, **agg}
+            for (zone_id, bucket), agg in buckets.items()
+        ])
+        table = model.__table__
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[table.c.zone_id, table.c.bucket],
+            set_={
+                "samples": table.c.samples + stmt.excluded.samples,
+                "total": table.c.total + stmt.excluded.total,
+                "min_count": func.least(table.c.min_count, stmt.excluded.min_count),
+                "max_count": func.greatest(table.c.max_count, stmt.excluded.max_count),
+            }
+        )
+        await session.execute(stmt)
@@ -11,30 +11,36 @@ from fastapi.middleware.cors import CORSMiddleware
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
 from backend.api import auth, dashboard, analytics, system
-from backend.core.sentinel_hub import hub
-from engine.vision.vision_module import VisionEngine
-from engine.audio.audio_module import AudioEngine
+from backend.core.config import API_ONLY
+from backend.core.sentinel_hub import create_hub
+from backend.db.partitions import maintenance_loop
 
-# Global Engines
-# Global Engines
-# Engines are now managed by SentinelHub
+# Engines are managed by SentinelHub, built in the lifespan (never at import)
+sio = socketio.AsyncServer(async_mode='asgi', cors_allowed_origins='*')
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Startup
     print("--- Sentinel-Pro Backend Starting ---")
-    
-    # Start Hub (Engines)
-    hub.start_engines()
-    
-    # Start Keep-Alive / Monitor Loop
-    asyncio.create_task(hub.monitor_loop())
-    
+    asyncio.create_task(maintenance_loop()) # crowd_logs partitions ahead / retention
+
+    hub = None
+    if API_ONLY:
+        print("[Main] API_ONLY: serving REST and analytics without engines")
+    else:
+        # Engines load in the background; the API answers right away
+        hub = create_hub(sio)
+        hub.log_writer.start()
+        startup = asyncio.create_task(hub.startup())
+
     yield
-    
+
     # Shutdown
     print("--- Sentinel-Pro Backend Stopping ---")
-    hub.stop_engines()
+    if hub is not None:
+        startup.cancel()
+        hub.stop_engines()
+        await hub.log_writer.stop() # Flush queued crowd logs
 
 app = FastAPI(title="Sentinel Pro", lifespan=lifespan)
 
@@ -53,9 +59,9 @@ app.add_middleware(
 # The recommend pattern is to wrap FastAPI: socketio_app = socketio.ASGIApp(sio, app)
 # But main:app expects FastAPI instance for OpenAPI.
 # Let's mount at /socket.io
-app.mount("/ws", hub.app) # This might be tricky with path stripping
+app.mount("/ws", socketio.ASGIApp(sio)) # This might be tricky with path stripping
 # Standard way: Wrap the whole thing
-app_sio = socketio.ASGIApp(hub.sio, app)
+app_sio = socketio.ASGIApp(sio, app)
 
 # Routes
 app.include_router(auth.router, prefix="/api/auth", tags=["Auth"])
@@ -65,7 +71,7 @@ app.include_router(system.router, prefix="/api/system", tags=["System"])
 
 @app.get("/")
 def health_check():
-    return {"status": "running", "system": "Sentinel Pro", "gpu": "RTX 2050 (Target)"}
+    return {"status": "running", "system": "Sentinel Pro", "gpu": "RTX 2050 (Target)", "api_only": API_ONLY}
 
 if __name__ == "__main__":
     # We must run 'app_sio' instead of 'app'
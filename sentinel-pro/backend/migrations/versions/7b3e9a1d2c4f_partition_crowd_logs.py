@@ -0,0 +1,194 @@
+"""Partition crowd_logs by month, binary coordinates
+
+Revision ID: 7b3e9a1d2c4f
+Revises: ce892ec17406
+Create Date: 2026-10-18 10:12:41.208113
+
+crowd_logs becomes a range-partitioned table (one partition per month plus a
+default partition), indexed on (zone_id, timestamp) and with a BRIN index on
+timestamp. coordinates changes from a JSON string to packed float32 rows
+(engine.shared_state.pack_coordinates). Existing rows are copied over and
+their JSON coordinates converted.
+
+Two SQL functions are installed for backend/db/partitions.py:
+crowd_logs_ensure_partition(month) and crowd_logs_drop_partitions(older_than).
+
+Incidents lose their foreign key to crowd_logs: a partitioned table can only be
+referenced through a key that includes the partition column.
+"""
+import json
+from typing import Sequence, Union
+
+from alembic import op
+import numpy as np
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '7b3e9a1d2c4f'
+down_revision: Union[str, Sequence[str], None] = 'ce892ec17406'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Frozen copy of engine.shared_state.COORD_DTYPE at the time of this migration
+COORD_FIELDS = ("x", "y", "pixel_x", "pixel_y", "map_x", "map_y")
+COORD_DTYPE = np.dtype([(name, np.float32) for name in COORD_FIELDS] + [("camera", np.uint8)])
+
+ENSURE_PARTITION = """
+CREATE OR REPLACE FUNCTION crowd_logs_ensure_partition(month date) RETURNS void AS $$
+DECLARE
+    start_date date := date_trunc('month', month)::date;
+BEGIN
+    EXECUTE format(
+        'CREATE TABLE IF NOT EXISTS %I PARTITION OF crowd_logs FOR VALUES FROM (%L) TO (%L)',
+        'crowd_logs_' || to_char(start_date, 'YYYY_MM'),
+        start_date,
+        (start_date + interval '1 month')::date
+    );
+END
+$$ LANGUAGE plpgsql;
+"""
+
+DROP_PARTITIONS = r"""
+CREATE OR REPLACE FUNCTION crowd_logs_drop_partitions(older_than timestamptz) RETURNS integer AS $$
+DECLARE
+    part record;
+    dropped integer := 0;
+BEGIN
+    FOR part IN
+        SELECT child.relname
+        FROM pg_inherits
+        JOIN pg_class child ON child.oid = pg_inherits.inhrelid
+        JOIN pg_class parent ON parent.oid = pg_inherits.inhparent
+        WHERE parent.relname = 'crowd_logs' AND child.relname ~ '^crowd_logs_\d{4}_\d{2}$'
+    LOOP
+        -- Only whole months that ended before the cutoff
+        IF to_date(substring(part.relname from 12), 'YYYY_MM') + interval '1 month' <= older_than THEN
+            EXECUTE format('DROP TABLE %I', part.relname);
+            dropped := dropped + 1;
+        END IF;
+    END LOOP;
+    RETURN dropped;
+END
+$$ LANGUAGE plpgsql;
+"""
+
+def pack_legacy(text):
+    """JSON coordinates (columnar dict or older list of point dicts) to packed COORD_DTYPE bytes."""
+    if not text:
+        return None
+    try:
+        data = json.loads(text)
+    except ValueError:
+        return None
+    if isinstance(data, list):
+        rows = [p for p in data if isinstance(p, dict)]
+        columns = {name: [p.get(name) for p in rows] for name in COORD_FIELDS}
+        length = len(rows)
+    elif isinstance(data, dict):
+        columns = data
+        length = len(data.get("x") or ())
+    else:
+        return None
+
+    packed = np.zeros(length, dtype=COORD_DTYPE)
+    for name in COORD_FIELDS:
+        values = columns.get(name)
+        if values is None or len(values) != length:
+            packed[name] = np.nan
+        else:
+            packed[name] = [np.nan if v is None else v for v in values]
+    return packed.tobytes()
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.drop_constraint('incidents_crowd_log_id_fkey', 'incidents', type_='foreignkey')
+    op.alter_column('incidents', 'crowd_log_id', type_=sa.BigInteger())
+    op.create_index(op.f('ix_incidents_crowd_log_id'), 'incidents', ['crowd_log_id'], unique=False)
+
+    op.drop_index('ix_crowd_logs_id', table_name='crowd_logs')
+    op.rename_table('crowd_logs', 'crowd_logs_legacy')
+    op.execute("ALTER INDEX crowd_logs_pkey RENAME TO crowd_logs_legacy_pkey")
+
+    op.execute("""
+        CREATE TABLE crowd_logs (
+            id bigserial NOT NULL,
+            timestamp timestamptz NOT NULL DEFAULT now(),
+            person_count integer,
+            risk_score varchar,
+            zone_id varchar,
+            coordinates bytea,
+            PRIMARY KEY (id, timestamp)
+        ) PARTITION BY RANGE (timestamp)
+    """)
+    op.execute("CREATE TABLE crowd_logs_default PARTITION OF crowd_logs DEFAULT")
+    op.create_index('ix_crowd_logs_zone_timestamp', 'crowd_logs', ['zone_id', 'timestamp'], unique=False)
+    op.create_index('ix_crowd_logs_timestamp_brin', 'crowd_logs', ['timestamp'], unique=False, postgresql_using='brin')
+
+    op.execute(ENSURE_PARTITION)
+    op.execute(DROP_PARTITIONS)
+    # One partition per month of existing data, through next month
+    op.execute("""
+        SELECT crowd_logs_ensure_partition(month::date)
+        FROM generate_series(
+            date_trunc('month', COALESCE((SELECT min(timestamp) FROM crowd_logs_legacy), now())),
+            date_trunc('month', now()) + interval '1 month',
+            interval '1 month'
+        ) AS month
+    """)
+
+    op.execute("""
+        INSERT INTO crowd_logs (id, timestamp, person_count, risk_score, zone_id)
+        SELECT id, COALESCE(timestamp, now()), person_count, risk_score, zone_id
+        FROM crowd_logs_legacy
+    """)
+    op.execute("SELECT setval(pg_get_serial_sequence('crowd_logs', 'id'), COALESCE((SELECT max(id) FROM crowd_logs), 0) + 1, false)")
+
+    # Convert JSON coordinates in batches
+    bind = op.get_bind()
+    update = sa.text("UPDATE crowd_logs SET coordinates = :packed WHERE id = :id")
+    last_id = 0
+    while True:
+        rows = bind.execute(sa.text(
+            "SELECT id, coordinates FROM crowd_logs_legacy "
+            "WHERE coordinates IS NOT NULL AND id > :last ORDER BY id LIMIT 5000"
+        ), {"last": last_id}).fetchall()
+        if not rows:
+            break
+        params = [{"id": row.id, "packed": pack_legacy(row.coordinates)} for row in rows]
+        params = [p for p in params if p["packed"] is not None]
+        if params:
+            bind.execute(update, params)
+        last_id = rows[-1].id
+
+    op.drop_table('crowd_logs_legacy')
+
+
+def downgrade() -> None:
+    """Downgrade schema. Coordinates are not converted back to JSON (they are dropped)."""
+    op.rename_table('crowd_logs', 'crowd_logs_partitioned')
+    op.execute("ALTER INDEX crowd_logs_pkey RENAME TO crowd_logs_partitioned_pkey")
+    op.create_table('crowd_logs',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('timestamp', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+    sa.Column('person_count', sa.Integer(), nullable=True),
+    sa.Column('risk_score', sa.String(), nullable=True),
+    sa.Column('zone_id', sa.String(), nullable=True),
+    sa.Column('coordinates', sa.String(), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_crowd_logs_id'), 'crowd_logs', ['id'], unique=False)
+    op.execute("""
+        INSERT INTO crowd_logs (id, timestamp, person_count, risk_score, zone_id)
+        SELECT id, timestamp, person_count, risk_score, zone_id FROM crowd_logs_partitioned
+    """)
+    op.execute("SELECT setval(pg_get_serial_sequence('crowd_logs', 'id'), COALESCE((SELECT max(id) FROM crowd_logs), 0) + 1, false)")
+    op.execute("DROP TABLE crowd_logs_partitioned CASCADE")
+    op.execute("DROP FUNCTION IF EXISTS crowd_logs_ensure_partition(date)")
+    op.execute("DROP FUNCTION IF EXISTS crowd_logs_drop_partitions(timestamptz)")
+
+    op.drop_index(op.f('ix_incidents_crowd_log_id'), table_name='incidents')
+    op.execute("UPDATE incidents SET crowd_log_id = NULL WHERE crowd_log_id NOT IN (SELECT id FROM crowd_logs)")
+    op.alter_column('incidents', 'crowd_log_id', type_=sa.Integer())
+    op.create_foreign_key('incidents_crowd_log_id_fkey', 'incidents', 'crowd_logs', ['crowd_log_id'], ['id'])
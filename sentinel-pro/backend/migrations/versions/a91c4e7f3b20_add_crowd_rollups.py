@@ -0,0 +1,53 @@
+"""Add per-minute and per-hour crowd rollups
+
+Revision ID: a91c4e7f3b20
+Revises: 7b3e9a1d2c4f
+Create Date: 2026-10-18 11:03:27.551920
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a91c4e7f3b20'
+down_revision: Union[str, Sequence[str], None] = '7b3e9a1d2c4f'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+ROLLUP_TABLES = {"crowd_rollup_minute": "minute", "crowd_rollup_hour": "hour"}
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    for table, unit in ROLLUP_TABLES.items():
+        op.create_table(table,
+        sa.Column('zone_id', sa.String(), nullable=False),
+        sa.Column('bucket', sa.DateTime(timezone=True), nullable=False),
+        sa.Column('samples', sa.Integer(), nullable=False),
+        sa.Column('total', sa.BigInteger(), nullable=False),
+        sa.Column('min_count', sa.Integer(), nullable=False),
+        sa.Column('max_count', sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint('zone_id', 'bucket')
+        )
+        op.create_index(f'ix_{table}_bucket', table, ['bucket'], unique=False)
+
+        # Backfill from existing logs (bucketed in UTC, like the log writer)
+        op.execute(f"""
+            INSERT INTO {table} (zone_id, bucket, samples, total, min_count, max_count)
+            SELECT COALESCE(zone_id, 'default'),
+                   date_trunc('{unit}', timestamp AT TIME ZONE 'UTC') AT TIME ZONE 'UTC',
+                   count(*), COALESCE(sum(person_count), 0),
+                   COALESCE(min(person_count), 0), COALESCE(max(person_count), 0)
+            FROM crowd_logs
+            GROUP BY 1, 2
+        """)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    for table in ROLLUP_TABLES:
+        op.drop_index(f'ix_{table}_bucket', table_name=table)
+        op.drop_table(table)
@@ -0,0 +1,36 @@
+"""Add heatmap grids
+
+Revision ID: c2d8f5a6e913
+Revises: a91c4e7f3b20
+Create Date: 2026-10-18 12:20:09.734581
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c2d8f5a6e913'
+down_revision: Union[str, Sequence[str], None] = 'a91c4e7f3b20'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('heatmap_grids',
+    sa.Column('grid_key', sa.String(), nullable=False),
+    sa.Column('resolution', sa.String(), nullable=False),
+    sa.Column('bucket', sa.DateTime(timezone=True), nullable=False),
+    sa.Column('size', sa.Integer(), nullable=False),
+    sa.Column('samples', sa.Integer(), nullable=False),
+    sa.Column('cells', sa.LargeBinary(), nullable=False),
+    sa.PrimaryKeyConstraint('grid_key', 'resolution', 'bucket')
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('heatmap_grids')
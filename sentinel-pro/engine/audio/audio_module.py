@@ -1,141 +1,386 @@
 import threading
 import time
+import wave
+import collections
 import numpy as np
 import pyaudio
-import librosa
 import joblib
 import os
-import queue
 from backend.core.config import (
-    AUDIO_RATE, AUDIO_CHUNK, AUDIO_BUFFER_SECONDS, 
-    RMS_THRESHOLD, SPECTRAL_CENTROID_THRESHOLD, 
-    PANIC_PERSISTENCE, AUDIO_MODEL_PATH
+    AUDIO_RATE, AUDIO_CHUNK, AUDIO_BUFFER_SECONDS,
+    RMS_THRESHOLD, SPECTRAL_CENTROID_THRESHOLD,
+    PANIC_PERSISTENCE, AUDIO_MODEL_PATH,
+    AUDIO_HOP_SECONDS, AUDIO_QUEUE_CHUNKS,
+    AUDIO_N_MFCC, AUDIO_ML_BATCH_HOPS, AUDIO_ML_THRESHOLD,
+    AUDIO_INPUTS, AUDIO_GLOBAL_ZONE,
+    AUDIO_REPLAY_FILE, AUDIO_REPLAY_ZONES, REPLAY_PACING, REPLAY_LOOP
 )
 from engine.shared_state import state
+from engine.instrumentation import metrics
+from engine.audio.features import StreamingFeatures
+
+def parse_inputs(spec):
+    """
+    Parse AUDIO_INPUTS ("cam0=default:0,cam1=default:1,cam2=3") into
+    {device index or None for default: {channel: zone}}.
+    """
+    devices = {}
+    for item in spec.split(","):
+        item = item.strip()
+        if not item:
+            continue
+        zone, _, target = item.partition("=")
+        device, _, channel = target.partition(":")
+        device = None if device.strip() in ("", "default") else int(device)
+        devices.setdefault(device, {})[int(channel or 0)] = zone.strip()
+    return devices
+
+def pcm_to_float(data, sample_width):
+    """Interleaved PCM bytes from a WAV file to float32 in [-1, 1] (same layout as capture)."""
+    if sample_width == 1:
+        return (np.frombuffer(data, dtype=np.uint8).astype(np.float32) - 128.0) / 128.0
+    if sample_width == 2:
+        return np.frombuffer(data, dtype="<i2").astype(np.float32) / 32768.0
+    if sample_width == 4:
+        return np.frombuffer(data, dtype="<i4").astype(np.float32) / 2147483648.0
+    raise ValueError(f"Unsupported WAV sample width: {sample_width} bytes")
+
+class AudioInput:
+    """
+    One capture device (possibly multi-channel) covering one zone per used channel.
+    Capture runs in the PyAudio callback and only appends chunks to a bounded deque
+    (append/popleft are atomic, no lock).
+    """
+
+    def __init__(self, device, channel_zones):
+        self.device = device # PyAudio index, None = default input
+        self.channel_map = sorted(channel_zones) # Device channels we analyse
+        self.zones = [channel_zones[c] for c in self.channel_map]
+        self.channels = max(self.channel_map) + 1 # Channels to open on the device
+        self.chunks = collections.deque(maxlen=AUDIO_QUEUE_CHUNKS)
+        self.dropped_chunks = 0 # Chunks evicted because analysis fell behind
+        self.overflows = 0 # Driver-reported input overflows
+        self.stream = None
+        self.rate = None
+        self.features = None
+        self.panic_counters = np.zeros(len(self.zones), dtype=np.int32)
+        self.pending_vectors = [] # (zones, features) rows waiting for the next batched prediction
+
+    def on_audio(self, in_data, frame_count, time_info, status_flags):
+        """PyAudio callback (audio thread): keep it allocation-light and never block."""
+        if status_flags & pyaudio.paInputOverflow:
+            self.overflows += 1
+        if len(self.chunks) == self.chunks.maxlen:
+            self.dropped_chunks += 1 # deque evicts the oldest chunk on append
+        self.chunks.append(np.frombuffer(in_data, dtype=np.float32))
+        return (None, pyaudio.paContinue)
+
+    def prepare(self, rate, n_mfcc):
+        # Circular buffer + running per-frame RMS/centroid over the last AUDIO_BUFFER_SECONDS
+        # (plus cached per-frame MFCCs when a classifier is loaded), all zones at once
+        self.rate = rate
+        self.features = StreamingFeatures(rate, AUDIO_BUFFER_SECONDS, n_mfcc=n_mfcc, channels=len(self.zones))
+
+    def drain(self):
+        """Everything captured since the last hop as (zones, samples), or None."""
+        pending = []
+        while self.chunks:
+            pending.append(self.chunks.popleft())
+        if not pending:
+            return None
+        # PyAudio delivers interleaved frames: de-interleave, keep the mapped channels
+        block = np.concatenate(pending).reshape(-1, self.channels)
+        return block[:, self.channel_map].T
 
 class AudioEngine(threading.Thread):
-    def __init__(self):
+    """
+    Handles every microphone in one thread: N devices and/or the channels of a
+    multi-channel device, each channel mapped to a zone (see AUDIO_INPUTS).
+    This thread is the analysis worker: it wakes every AUDIO_HOP_SECONDS, drains
+    every input and publishes per-zone panic status.
+    With replay_file set, a WAV file (one zone per channel, AUDIO_REPLAY_ZONES) is
+    fed through the same analysis path instead of the microphones.
+    """
+
+    def __init__(self, inputs=None, replay_file=AUDIO_REPLAY_FILE, pacing=REPLAY_PACING, loop=REPLAY_LOOP):
         super().__init__()
         self.running = False
-        self.panic_counter = 0
+        self.replay_file = replay_file
+        self.pacing = pacing
+        self.loop = loop
+        self.replay_done = threading.Event() # Set once the replay reached end of file
+        self.hops_processed = 0
+        self.step_permits = threading.Semaphore(0)
         self.ml_model = None
         self.scaler = None
-        self.ptr_lock = threading.Lock()
-        
+        self.late_hops = 0 # Hops where analysis took longer than AUDIO_HOP_SECONDS
+        self.errors = 0
+
+        # Default: one mono input on the default device covering every camera
+        if inputs is None and replay_file:
+            zones = [zone.strip() for zone in AUDIO_REPLAY_ZONES.split(",") if zone.strip()]
+            inputs = {None: dict(enumerate(zones))}
+        elif inputs is None:
+            inputs = parse_inputs(AUDIO_INPUTS or f"{AUDIO_GLOBAL_ZONE}=default")
+        self.inputs = [AudioInput(device, zones) for device, zones in inputs.items()]
+        self.zone_status = {zone: "NORMAL" for audio_input in self.inputs for zone in audio_input.zones}
+
+        self.panic_column = None # Column of predict_proba holding the panic class
+
         # Load ML Model if exists
         if os.path.exists(AUDIO_MODEL_PATH):
             try:
-                self.ml_model = joblib.load(AUDIO_MODEL_PATH) 
+                loaded = joblib.load(AUDIO_MODEL_PATH)
+                # Either a bare classifier or {"model": clf, "scaler": scaler}
+                if isinstance(loaded, dict):
+                    self.ml_model = loaded["model"]
+                    self.scaler = loaded.get("scaler")
+                else:
+                    self.ml_model = loaded
+                self.panic_column = self.find_panic_column(self.ml_model)
+                # The first stage that sees the raw vector must match the streaming layout
+                expected = StreamingFeatures.vector_length(AUDIO_N_MFCC)
+                first_stage = self.scaler if self.scaler is not None else self.ml_model
+                n_features = getattr(first_stage, "n_features_in_", expected)
+                if n_features != expected:
+                    raise ValueError(f"model expects {n_features} features, extractor produces {expected}")
                 print("[AudioEngine] ML Model loaded.")
-            except:
-                print("[AudioEngine] ML Model load failed, falling back to heuristics.")
-
-    def detect_heuristic(self, y, sr):
-        # RMS
-        rms = librosa.feature.rms(y=y)
-        rms_mean = np.mean(rms)
-        
-        # Centroid (Fast)
-        cent = librosa.feature.spectral_centroid(y=y, sr=sr)
-        cent_mean = np.mean(cent)
-        
-        # Logic
-        is_panic = (rms_mean > RMS_THRESHOLD) and (cent_mean > SPECTRAL_CENTROID_THRESHOLD)
+            except Exception as e:
+                self.ml_model = None
+                self.scaler = None
+                print(f"[AudioEngine] ML Model load failed ({e}), falling back to heuristics.")
+
+    def detect_heuristic(self, rms_mean, cent_mean):
+        # Loud (RMS) and shrill (high spectral centroid) over the whole window, elementwise per zone
+        is_panic = (rms_mean > RMS_THRESHOLD) & (cent_mean > SPECTRAL_CENTROID_THRESHOLD)
         return is_panic
 
-    def run(self):
-        print("[AudioEngine] Starting Audio Stream...")
-        p = pyaudio.PyAudio()
-        stream = None
-        used_rate = AUDIO_RATE
-        
+    @staticmethod
+    def find_panic_column(model):
+        classes = list(getattr(model, "classes_", []))
+        for label in (1, True, "panic", "PANIC"):
+            if label in classes:
+                return classes.index(label)
+        return len(classes) - 1 if classes else 1
+
+    def detect_ml(self, vectors):
+        """One predict_proba call for a batch of feature vectors. Returns a bool per row."""
+        if self.scaler is not None:
+            vectors = self.scaler.transform(vectors)
+        proba = self.ml_model.predict_proba(vectors)
+        return proba[:, self.panic_column] >= AUDIO_ML_THRESHOLD
+
+    def open_stream(self, p, audio_input):
+        """Open a callback input stream for one input. Returns (stream, rate) or (None, None)."""
         # Candidate rates to try if default fails
         rates_to_try = [AUDIO_RATE, 44100, 16000, 8000]
         # Remove duplicates while preserving order
         rates_to_try = list(dict.fromkeys(rates_to_try))
 
-        # 1. Try Default Device with configured rate
+        def try_open(device_index, rate):
+            return p.open(format=pyaudio.paFloat32,
+                          channels=audio_input.channels,
+                          rate=rate,
+                          input=True,
+                          input_device_index=device_index,
+                          frames_per_buffer=AUDIO_CHUNK,
+                          stream_callback=audio_input.on_audio,
+                          start=False)
+
+        # 1. Try the configured device (or the default one)
+        label = "default input device" if audio_input.device is None else f"device {audio_input.device}"
+        for r in rates_to_try:
+            try:
+                stream = try_open(audio_input.device, r)
+                print(f"[AudioEngine] Connected to {label} at {r}Hz ({audio_input.channels} ch, zones: {audio_input.zones})")
+                return stream, r
+            except Exception as e:
+                last_error = e
+        print(f"[AudioEngine] {label} failed: {last_error}.")
+        if audio_input.device is not None:
+            return None, None
+
+        # 2. Default device: search for any working device/rate combination
+        print("[AudioEngine] Scanning devices...")
+        for i in range(p.get_device_count()):
+            try:
+                info = p.get_device_info_by_index(i)
+                if info['maxInputChannels'] >= audio_input.channels:
+                    # Try rates
+                    for r in rates_to_try:
+                        try:
+                            stream = try_open(i, r)
+                            print(f"[AudioEngine] Connected to device {i} ({info['name']}) at {r}Hz")
+                            return stream, r
+                        except:
+                            continue
+            except:
+                continue
+        return None, None
+
+    def analyse(self, audio_input):
+        """One hop for one input: drain captured audio, update features and zone panic counters."""
+        samples = audio_input.drain()
+        if samples is None:
+            return
+
+        features = audio_input.features
+        features.push(samples)
+
+        if self.ml_model is not None:
+            # Batch several hops (x every zone) into one predict_proba call
+            vectors = features.feature_vector()
+            if vectors is not None:
+                audio_input.pending_vectors.append(vectors)
+            if len(audio_input.pending_vectors) < AUDIO_ML_BATCH_HOPS:
+                return
+            hops = len(audio_input.pending_vectors)
+            try:
+                decisions = self.detect_ml(np.concatenate(audio_input.pending_vectors)).reshape(hops, -1)
+            finally:
+                # A failed prediction drops its batch instead of growing it every hop
+                audio_input.pending_vectors.clear()
+        else:
+            rms_mean, cent_mean = features.means()
+            decisions = self.detect_heuristic(rms_mean, cent_mean)[None, :]
+
+        # Temporal Smoothing (one step per analysed hop, all zones at once)
+        counters = audio_input.panic_counters
+        for is_panic in decisions:
+            counters = np.where(is_panic, counters + 1, np.maximum(counters - 1, 0))
+        audio_input.panic_counters = counters
+
+        for zone, counter in zip(audio_input.zones, counters):
+            self.zone_status[zone] = "PANIC" if counter >= PANIC_PERSISTENCE else "NORMAL"
+
+    def analyse_timed(self, audio_input):
+        """analyse() with stage timing; errors are counted and reported instead of killing the thread."""
         try:
-            stream = p.open(format=pyaudio.paFloat32,
-                            channels=1,
-                            rate=AUDIO_RATE,
-                            input=True,
-                            frames_per_buffer=AUDIO_CHUNK)
-            print(f"[AudioEngine] Connected to default input device at {AUDIO_RATE}Hz.")
+            with metrics.time("audio_analysis"):
+                self.analyse(audio_input)
         except Exception as e:
-            print(f"[AudioEngine] Default device failed: {e}. Scanning devices...")
-
-        # 2. Search for any working device/rate combination
-        if stream is None:
-            for i in range(p.get_device_count()):
-                try:
-                    info = p.get_device_info_by_index(i)
-                    if info['maxInputChannels'] > 0:
-                        # Try rates
-                        for r in rates_to_try:
-                            try:
-                                stream = p.open(format=pyaudio.paFloat32,
-                                                channels=1,
-                                                rate=r,
-                                                input=True,
-                                                input_device_index=i,
-                                                frames_per_buffer=AUDIO_CHUNK)
-                                print(f"[AudioEngine] Connected to device {i} ({info['name']}) at {r}Hz")
-                                used_rate = r
-                                break
-                            except:
-                                continue
-                        if stream: break
-                except:
+            self.errors += 1
+            metrics.increment("audio_errors")
+            # First error, then every 100th, so a persistent fault doesn't flood the log at the hop rate
+            if self.errors == 1 or self.errors % 100 == 0:
+                print(f"[AudioEngine] Analysis error ({self.errors} so far): {e}")
+
+    def metrics(self):
+        return {
+            "dropped_chunks": sum(i.dropped_chunks for i in self.inputs),
+            "overflows": sum(i.overflows for i in self.inputs),
+            "late_hops": self.late_hops,
+            "queue_depth": max((len(i.chunks) for i in self.inputs), default=0),
+            "errors": self.errors,
+            "inputs": sum(1 for i in self.inputs if i.stream is not None),
+            "detector": "ml" if self.ml_model is not None else "heuristic"
+        }
+
+    def step(self, hops=1):
+        """Replay with pacing "step": analyse `hops` more hops of the file."""
+        for _ in range(hops):
+            self.step_permits.release()
+
+    def publish(self):
+        state.update_audio_zones(self.zone_status)
+        state.update_metrics("audio", self.metrics())
+
+    def run_replay(self):
+        """Feed the WAV file hop by hop into the same drain/analyse path as live capture."""
+        try:
+            wav = wave.open(self.replay_file, "rb")
+        except (OSError, wave.Error) as e:
+            print(f"[AudioEngine] Could not open replay file {self.replay_file}: {e}")
+            self.replay_done.set()
+            return
+
+        rate, sample_width = wav.getframerate(), wav.getsampwidth()
+        audio_input = self.inputs[0]
+        audio_input.channels = wav.getnchannels() # Frames are interleaved over every file channel
+        audio_input.channel_map = [c for c in audio_input.channel_map if c < audio_input.channels]
+        audio_input.zones = audio_input.zones[:len(audio_input.channel_map)]
+        audio_input.panic_counters = audio_input.panic_counters[:len(audio_input.zones)]
+        audio_input.prepare(rate, AUDIO_N_MFCC if self.ml_model is not None else 0)
+        print(f"[AudioEngine] Replaying {self.replay_file} at {rate}Hz ({self.pacing}, zones: {audio_input.zones})")
+
+        hop = int(AUDIO_HOP_SECONDS * rate)
+        self.running = True
+        next_hop = time.monotonic()
+        while self.running:
+            if self.pacing == "step":
+                self.step_permits.acquire()
+                if not self.running:
+                    break
+
+            data = wav.readframes(hop)
+            if not data:
+                if self.loop:
+                    wav.rewind()
                     continue
+                print(f"[AudioEngine] Replay finished after {self.hops_processed} hops.")
+                break
+
+            audio_input.chunks.append(pcm_to_float(data, sample_width))
+            self.analyse_timed(audio_input)
+            self.hops_processed += 1
+            self.publish()
 
-        if stream is None:
+            if self.pacing == "realtime":
+                next_hop += AUDIO_HOP_SECONDS
+                delay = next_hop - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+
+        wav.close()
+        self.running = False
+        self.replay_done.set()
+
+    def run(self):
+        if self.replay_file:
+            return self.run_replay()
+
+        print("[AudioEngine] Starting Audio Stream...")
+        p = pyaudio.PyAudio()
+        n_mfcc = AUDIO_N_MFCC if self.ml_model is not None else 0
+        for audio_input in self.inputs:
+            audio_input.stream, rate = self.open_stream(p, audio_input)
+            if audio_input.stream is not None:
+                audio_input.prepare(rate, n_mfcc)
+        active = [i for i in self.inputs if i.stream is not None]
+
+        if not active:
              print("[AudioEngine] No working audio input device found. Audio analysis disabled.")
              print("[AudioEngine] HINT: Check Windows Microphone Privacy Settings and allow apps to access the microphone.")
              p.terminate()
              return
 
         self.running = True
-        
-        # Use used_rate for buffer calculation
-        buffer_len = int(used_rate * AUDIO_BUFFER_SECONDS)
-        audio_buffer = np.zeros(buffer_len, dtype=np.float32)
+        for audio_input in active:
+            audio_input.stream.start_stream()
 
+        next_hop = time.monotonic()
         while self.running:
-            try:
-                if stream.get_read_available() < AUDIO_CHUNK:
-                    time.sleep(0.01)
-                    continue
+            for audio_input in active:
+                self.analyse_timed(audio_input)
 
-                data = stream.read(AUDIO_CHUNK, exception_on_overflow=False)
-                chunk = np.frombuffer(data, dtype=np.float32)
-                
-                # Roll Buffer
-                audio_buffer = np.roll(audio_buffer, -AUDIO_CHUNK)
-                audio_buffer[-AUDIO_CHUNK:] = chunk
-                
-                # Detection using actual rate
-                is_panic = self.detect_heuristic(audio_buffer, used_rate)
-                
-                # Temporal Smoothing
-                if is_panic:
-                    self.panic_counter += 1
-                else:
-                    self.panic_counter = max(0, self.panic_counter - 1)
-                
-                final_status = "PANIC" if self.panic_counter >= PANIC_PERSISTENCE else "NORMAL"
-                
-                # Update Hub
-                state.update_audio(final_status)
-                
-            except Exception as e:
-                 # print(f"[AudioEngine] {e}")
-                 pass
-        
-        stream.stop_stream()
-        stream.close()
+            # Update Hub
+            self.publish()
+
+            # Fixed hop schedule, independent of how chunks arrive
+            next_hop += AUDIO_HOP_SECONDS
+            delay = next_hop - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            else:
+                self.late_hops += 1
+                next_hop = time.monotonic() # Don't try to catch up with a burst
+
+        for audio_input in active:
+            audio_input.stream.stop_stream()
+            audio_input.stream.close()
         p.terminate()
         print("[AudioEngine] Stopped.")
 
     def stop(self):
         self.running = False
+        self.step_permits.release() # Unblock a stepping replay
@@ -0,0 +1,158 @@
+import numpy as np
+
+class AudioRingBuffer:
+    """
+    Preallocated circular sample buffer, one row per channel.
+    Writing a chunk costs O(chunk) (at most two slice copies) instead of the
+    O(window) allocation + copy of np.roll.
+    """
+
+    def __init__(self, capacity, channels=1, dtype=np.float32):
+        self.capacity = capacity
+        self.data = np.zeros((channels, capacity), dtype=dtype)
+        self.total = 0 # Samples ever written (per channel); write position is total % capacity
+
+    def write(self, chunk):
+        """chunk: (channels, n) or (n,) for a single channel."""
+        chunk = np.atleast_2d(chunk)
+        n = chunk.shape[1]
+        if n >= self.capacity:
+            chunk = chunk[:, -self.capacity:]
+            self.total += n - self.capacity
+            n = self.capacity
+        start = self.total % self.capacity
+        first = min(n, self.capacity - start)
+        self.data[:, start:start + first] = chunk[:, :first]
+        if first < n:
+            self.data[:, :n - first] = chunk[:, first:]
+        self.total += n
+
+    def read(self, start, length):
+        """(channels, length) copy starting at absolute sample index `start`."""
+        begin = start % self.capacity
+        if begin + length <= self.capacity:
+            return self.data[:, begin:begin + length].copy()
+        head = self.capacity - begin
+        return np.concatenate([self.data[:, begin:], self.data[:, :length - head]], axis=1)
+
+    def latest(self, length):
+        """The most recent `length` samples in chronological order."""
+        length = min(length, self.capacity, self.total)
+        return self.read(self.total - length, length)
+
+def dct_matrix(n_out, n_in):
+    """Orthonormal DCT-II basis (same as scipy dct(type=2, norm='ortho'), as used for MFCCs)."""
+    k = np.arange(n_out)[:, None]
+    n = np.arange(n_in)[None, :]
+    basis = np.cos(np.pi * k * (2 * n + 1) / (2 * n_in)) * np.sqrt(2.0 / n_in)
+    basis[0] /= np.sqrt(2.0)
+    return basis.astype(np.float32)
+
+class StreamingFeatures:
+    """
+    RMS and spectral centroid over a sliding window, updated incrementally.
+    Samples go into an AudioRingBuffer; every push only analyses the STFT frames
+    the new samples complete (Hann window, same frame/hop as librosa defaults),
+    and window means are kept as running sums over a ring of per-frame values.
+    All channels are processed together as one array, and every statistic has a
+    leading channel axis.
+    With n_mfcc > 0 the same spectra also yield per-frame MFCCs, cached in a ring,
+    so a classifier feature vector costs nothing beyond the new frames.
+    """
+
+    def __init__(self, sr, window_seconds, frame_length=2048, hop_length=512, n_mfcc=0, n_mels=40, channels=1):
+        self.sr = sr
+        self.channels = channels
+        self.frame_length = frame_length
+        self.hop_length = hop_length
+        window_samples = max(int(sr * window_seconds), frame_length)
+        self.n_frames = 1 + (window_samples - frame_length) // hop_length
+        self.samples = AudioRingBuffer(window_samples + hop_length, channels)
+        self.window = np.hanning(frame_length + 1)[:-1].astype(np.float32) # Periodic Hann
+        self.freqs = np.fft.rfftfreq(frame_length, d=1.0 / sr).astype(np.float32)
+
+        self.rms = np.zeros((channels, self.n_frames), dtype=np.float64)
+        self.centroid = np.zeros((channels, self.n_frames), dtype=np.float64)
+        self.rms_sum = np.zeros(channels)
+        self.centroid_sum = np.zeros(channels)
+        self.frames_done = 0 # Frames analysed so far
+        self._updates = 0
+
+        self.n_mfcc = n_mfcc
+        if n_mfcc:
+            import librosa # Only needed for the mel filterbank, and only with a classifier
+            self.mel_basis = librosa.filters.mel(sr=sr, n_fft=frame_length, n_mels=n_mels).astype(np.float32)
+            self.dct = dct_matrix(n_mfcc, n_mels)
+            self.mfcc = np.zeros((channels, self.n_frames, n_mfcc), dtype=np.float32)
+
+    def push(self, chunk):
+        """Add samples ((channels, n) or (n,)) and analyse newly completed frames. Returns how many."""
+        self.samples.write(chunk)
+        # Frame k covers samples [k*hop, k*hop + frame_length)
+        available = (self.samples.total - self.frame_length) // self.hop_length + 1
+        new = max(0, available - self.frames_done)
+        if not new:
+            return 0
+        # Frames older than the buffer can no longer be read (huge chunk): skip them
+        oldest = max(0, (self.samples.total - self.samples.capacity) // self.hop_length + 1)
+        first = max(self.frames_done, oldest)
+        # (channels, frames, frame_length)
+        frames = np.stack([
+            self.samples.read(k * self.hop_length, self.frame_length)
+            for k in range(first, available)
+        ], axis=1)
+        self._add_frames(first, frames)
+        self.frames_done = available
+        return frames.shape[1]
+
+    def _add_frames(self, first_index, frames):
+        rms = np.sqrt(np.mean(frames.astype(np.float64) ** 2, axis=-1))
+        mag = np.abs(np.fft.rfft(frames * self.window, axis=-1))
+        mag_sum = mag.sum(axis=-1)
+        centroid = np.divide(mag @ self.freqs, mag_sum, out=np.zeros_like(mag_sum), where=mag_sum > 0)
+
+        count = frames.shape[1]
+        slots = np.arange(first_index, first_index + count) % self.n_frames
+        if self.n_mfcc:
+            mel = (mag ** 2) @ self.mel_basis.T
+            log_mel = 10.0 * np.log10(np.maximum(mel, 1e-10)) # power_to_db
+            self.mfcc[:, slots] = log_mel @ self.dct.T
+        if count >= self.n_frames or self._updates % 1000 == 999:
+            # Bulk replace, or periodic resync of the running sums against float drift
+            self.rms[:, slots] = rms
+            self.centroid[:, slots] = centroid
+            self.rms_sum = self.rms.sum(axis=1)
+            self.centroid_sum = self.centroid.sum(axis=1)
+        else:
+            self.rms_sum += rms.sum(axis=1) - self.rms[:, slots].sum(axis=1)
+            self.centroid_sum += centroid.sum(axis=1) - self.centroid[:, slots].sum(axis=1)
+            self.rms[:, slots] = rms
+            self.centroid[:, slots] = centroid
+        self._updates += 1
+
+    def means(self):
+        """(rms_mean, centroid_mean) per channel over the frames currently in the window."""
+        count = min(self.frames_done, self.n_frames)
+        if not count:
+            return np.zeros(self.channels), np.zeros(self.channels)
+        return self.rms_sum / count, self.centroid_sum / count
+
+    @staticmethod
+    def vector_length(n_mfcc):
+        """Width of feature_vector() rows for n_mfcc coefficients."""
+        return 2 * n_mfcc + 2
+
+    def feature_vector(self):
+        """
+        Compact per-hop descriptor for the classifier, one row per channel:
+        [mfcc means (n_mfcc), mfcc stds (n_mfcc), rms mean, centroid mean].
+        A classifier.pkl must be trained on this layout.
+        """
+        count = min(self.frames_done, self.n_frames)
+        if not count or not self.n_mfcc:
+            return None
+        valid = self.mfcc if count == self.n_frames else self.mfcc[:, :count]
+        rms_mean, cent_mean = self.means()
+        return np.concatenate([
+            valid.mean(axis=1), valid.std(axis=1), rms_mean[:, None], cent_mean[:, None]
+        ], axis=1).astype(np.float32)
@@ -0,0 +1,118 @@
+import threading
+import time
+import bisect
+
+# Histogram bucket upper bounds in seconds (Prometheus `le` labels)
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+class Histogram:
+    """Fixed-bucket latency histogram. observe() is a bisect plus three additions."""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1) # Last slot is +Inf
+        self.total = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, seconds):
+        index = bisect.bisect_left(self.buckets, seconds)
+        with self._lock:
+            self.counts[index] += 1
+            self.total += seconds
+            self.count += 1
+
+    def snapshot(self):
+        """(cumulative bucket counts, sum, count)."""
+        with self._lock:
+            counts, total, count = list(self.counts), self.total, self.count
+        cumulative, running = [], 0
+        for c in counts:
+            running += c
+            cumulative.append(running)
+        return cumulative, total, count
+
+class StageTimer:
+    """Context manager timing one stage with the monotonic perf counter."""
+    __slots__ = ("histogram", "start", "seconds")
+
+    def __init__(self, histogram):
+        self.histogram = histogram
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.seconds = time.perf_counter() - self.start
+        self.histogram.observe(self.seconds)
+        return False
+
+class Instrumentation:
+    """
+    Process-wide stage latency histograms and event counters.
+    Engines wrap a stage in `with metrics.time("inference"):`; /api/system/metrics
+    renders everything (plus the engines' SharedState metrics) in the Prometheus
+    text exposition format.
+    """
+
+    def __init__(self):
+        self._histograms = {} # stage -> Histogram
+        self._counters = {} # event -> count
+        self._lock = threading.Lock()
+
+    def histogram(self, stage):
+        histogram = self._histograms.get(stage)
+        if histogram is None:
+            with self._lock:
+                histogram = self._histograms.setdefault(stage, Histogram())
+        return histogram
+
+    def time(self, stage):
+        return StageTimer(self.histogram(stage))
+
+    def observe(self, stage, seconds):
+        self.histogram(stage).observe(seconds)
+
+    def increment(self, event, amount=1):
+        with self._lock:
+            self._counters[event] = self._counters.get(event, 0) + amount
+
+    def render(self, engine_metrics=None):
+        """Prometheus text exposition of all stages, counters and numeric engine metrics."""
+        lines = [
+            "# HELP sentinel_stage_seconds Latency of one pipeline stage.",
+            "# TYPE sentinel_stage_seconds histogram",
+        ]
+        with self._lock:
+            histograms = sorted(self._histograms.items())
+        for stage, histogram in histograms:
+            cumulative, total, count = histogram.snapshot()
+            for bound, value in zip(histogram.buckets, cumulative):
+                lines.append(f'sentinel_stage_seconds_bucket{{stage="{stage}",le="{bound}"}} {value}')
+            lines.append(f'sentinel_stage_seconds_bucket{{stage="{stage}",le="+Inf"}} {cumulative[-1]}')
+            lines.append(f'sentinel_stage_seconds_sum{{stage="{stage}"}} {total}')
+            lines.append(f'sentinel_stage_seconds_count{{stage="{stage}"}} {count}')
+
+        lines += [
+            "# HELP sentinel_events_total Events counted by the engines (errors, drops).",
+            "# TYPE sentinel_events_total counter",
+        ]
+        with self._lock:
+            counters = sorted(self._counters.items())
+        for event, value in counters:
+            lines.append(f'sentinel_events_total{{event="{event}"}} {value}')
+
+        if engine_metrics:
+            lines += [
+                "# HELP sentinel_engine_metric Latest numeric metric reported by an engine.",
+                "# TYPE sentinel_engine_metric gauge",
+            ]
+            for engine, values in sorted(engine_metrics.items()):
+                for name, value in sorted(values.items()):
+                    if isinstance(value, (int, float)) and not isinstance(value, bool):
+                        lines.append(f'sentinel_engine_metric{{engine="{engine}",metric="{name}"}} {value}')
+        return "\n".join(lines) + "\n"
+
+# Global Singleton
+metrics = Instrumentation()
@@ -1,43 +1,431 @@
 import threading
 import time
+import asyncio
+import numpy as np
+
+# Ordering used to pick the worst camera when aggregating
+RISK_ORDER = {"SAFE": 0, "LOW": 1, "MEDIUM": 2, "HIGH": 3}
+
+# Detection layout: one row per person, map_x/map_y are NaN until a homography is set
+COORD_FIELDS = ("x", "y", "pixel_x", "pixel_y", "map_x", "map_y")
+COORD_DTYPE = np.dtype([(name, np.float32) for name in COORD_FIELDS] + [("camera", np.uint8)])
+
+class CoordinateStore:
+    """
+    Preallocated struct-array storage for detections.
+    Writers fill the next slot of a small ring and bump `generation`; readers get
+    read-only views of the published slot. A view stays valid until the ring wraps
+    (two more publishes), so copy it if you need to keep it longer.
+    Not thread-safe on its own: SharedState calls it under its lock.
+    """
+
+    def __init__(self, capacity=512, slots=3):
+        self._slots = [np.zeros(capacity, dtype=COORD_DTYPE) for _ in range(slots)]
+        self._index = 0
+        self._length = 0
+        self.generation = 0
+
+    def publish(self, column_sets):
+        """Write columnar detections ({"x": arr, ...} per camera) into the next slot."""
+        total = sum(len(columns.get("x", ())) for columns in column_sets)
+        next_index = (self._index + 1) % len(self._slots)
+        buf = self._slots[next_index]
+        if total > len(buf):
+            # Grow geometrically so a busy scene only reallocates a few times
+            buf = np.zeros(max(total, 2 * len(buf)), dtype=COORD_DTYPE)
+            self._slots[next_index] = buf
+
+        offset = 0
+        for camera_index, columns in enumerate(column_sets):
+            n = len(columns.get("x", ()))
+            if not n:
+                continue
+            rows = buf[offset:offset + n]
+            for name in COORD_FIELDS:
+                col = columns.get(name)
+                rows[name] = col if col is not None else np.nan
+            rows["camera"] = camera_index
+            offset += n
+
+        self._index = next_index
+        self._length = total
+        self.generation += 1
+
+    def view(self):
+        """(generation, read-only view) of the latest published detections."""
+        view = self._slots[self._index][:self._length]
+        view.flags.writeable = False
+        return self.generation, view
+
+def encode_coordinates(view, camera_ids):
+    """Columnar, JSON friendly payload from a detection view (one tolist() per field)."""
+    payload = {}
+    for name in COORD_FIELDS:
+        col = view[name]
+        nan = np.isnan(col)
+        if nan.all() and len(col):
+            continue # No homography: leave map_x/map_y out
+        if nan.any():
+            # Mixed homography state across cameras: JSON null for the missing rows
+            payload[name] = [None if missing else v for v, missing in zip(col.tolist(), nan.tolist())]
+        else:
+            payload[name] = col.tolist()
+    payload["camera_id"] = np.array(camera_ids or [""])[view["camera"]].tolist()
+    return payload
+
+# Wire format for live broadcasts: normalized fields quantized to uint16 (1/65535 steps),
+# pixels as uint16, floor-plan coordinates as float32 (their range depends on the map)
+QUANTIZED_FIELDS = ("x", "y")
+PIXEL_FIELDS = ("pixel_x", "pixel_y")
+MAP_FIELDS = ("map_x", "map_y")
+
+def encode_coordinates_binary(view, camera_ids):
+    """
+    Compact broadcast payload: one little-endian byte string per field (sent as
+    Socket.IO binary attachments) plus the camera index per row.
+    """
+    payload = {"n": len(view), "cameras": list(camera_ids or [])}
+    for name in QUANTIZED_FIELDS:
+        payload[name] = np.round(np.clip(np.nan_to_num(view[name]), 0.0, 1.0) * 65535).astype("<u2").tobytes()
+    for name in PIXEL_FIELDS:
+        payload[name] = np.clip(np.nan_to_num(view[name]), 0, 65535).astype("<u2").tobytes()
+    if len(view) and not np.isnan(view["map_x"]).all():
+        for name in MAP_FIELDS:
+            payload[name] = view[name].astype("<f4").tobytes() # NaN where a camera has no homography
+    payload["camera"] = view["camera"].astype(np.uint8).tobytes()
+    return payload
+
+def pack_coordinates(view):
+    """Compact binary form of a detection view for storage (raw COORD_DTYPE rows, 25 bytes each)."""
+    return np.ascontiguousarray(view).tobytes()
+
+def unpack_coordinates(blob):
+    """Struct array (COORD_DTYPE) back from pack_coordinates() bytes."""
+    if not blob:
+        return np.zeros(0, dtype=COORD_DTYPE)
+    return np.frombuffer(blob, dtype=COORD_DTYPE)
+
+class FrameSubscription:
+    """
+    One async reader of a FrameChannel (e.g. one MJPEG client).
+    Publishes only set an event, so a slow client skips straight to the newest
+    frame instead of queueing the ones it missed.
+    """
+
+    def __init__(self, channel, loop):
+        self.channel = channel
+        self.loop = loop
+        self.event = asyncio.Event()
+        self.last_seq = 0
+
+    def notify(self):
+        # Called from the writer thread
+        try:
+            self.loop.call_soon_threadsafe(self.event.set)
+        except RuntimeError:
+            pass # Loop already closed, the subscription is about to be dropped
+
+    async def next(self, timeout=None):
+        """Next unseen frame, or None if nothing new arrives within timeout."""
+        while True:
+            seq, frame = self.channel.latest()
+            if seq > self.last_seq:
+                self.last_seq = seq
+                return frame
+            self.event.clear()
+            # A publish may have landed between latest() and clear()
+            if self.channel.latest()[0] > self.last_seq:
+                continue
+            try:
+                await asyncio.wait_for(self.event.wait(), timeout)
+            except asyncio.TimeoutError:
+                return None
+
+    def close(self):
+        self.channel.unsubscribe(self)
+
+class FrameChannel:
+    """
+    Single-writer frame publication with sequence numbers.
+    The writer fills a ring of buffers and swaps a (seq, index) head reference;
+    readers take the head without any lock and can block until the sequence moves on.
+    """
+
+    def __init__(self, buffers=3):
+        self._buffers = [None] * buffers # Triple buffering: writer never touches the slot just handed out
+        self._head = (0, 0) # (seq, buffer index), replaced atomically
+        self._cond = threading.Condition() # Only taken by waiting readers (and the writer if any wait)
+        self._waiters = 0
+        self._subscribers = () # Async readers, copy-on-write so publish never locks
+
+    @property
+    def subscriber_count(self):
+        return len(self._subscribers) + self._waiters
+
+    def publish(self, frame):
+        seq, index = self._head
+        next_index = (index + 1) % len(self._buffers)
+        self._buffers[next_index] = frame
+        self._head = (seq + 1, next_index)
+        for subscription in self._subscribers:
+            subscription.notify()
+        if self._waiters:
+            with self._cond:
+                self._cond.notify_all()
+
+    def subscribe(self):
+        """Register an async reader. Must be called from the event loop that will consume it."""
+        subscription = FrameSubscription(self, asyncio.get_running_loop())
+        with self._cond:
+            self._subscribers = self._subscribers + (subscription,)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._cond:
+            self._subscribers = tuple(s for s in self._subscribers if s is not subscription)
+
+    def latest(self):
+        """(seq, frame) of the newest publication, lock-free. seq is 0 before the first frame."""
+        seq, index = self._head
+        return seq, self._buffers[index]
+
+    def wait(self, after_seq, timeout=None):
+        """Block until a frame newer than after_seq is published. Returns (seq, frame) or None on timeout."""
+        if self._head[0] > after_seq:
+            return self.latest()
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            self._waiters += 1
+            try:
+                # Re-check after registering so a publish in between is never missed
+                while self._head[0] <= after_seq:
+                    remaining = None if deadline is None else deadline - time.monotonic()
+                    if remaining is not None and remaining <= 0:
+                        return None
+                    self._cond.wait(remaining)
+            finally:
+                self._waiters -= 1
+        return self.latest()
+
+class ChangeSubscription:
+    """One asyncio consumer of a ChangeSignal (e.g. the hub's monitor loop)."""
+
+    def __init__(self, signal, loop):
+        self.signal = signal
+        self.loop = loop
+        self.event = asyncio.Event()
+        self.last_version = signal.version
+        self._pending = False # A wake-up is already scheduled on the loop
+
+    def notify(self):
+        # Called from engine threads: at most one thread hop per consumer wake-up
+        if self._pending:
+            return
+        self._pending = True
+        try:
+            self.loop.call_soon_threadsafe(self.event.set)
+        except RuntimeError:
+            pass # Loop already closed
+
+    async def wait(self, timeout=None):
+        """True once the state changed since the last call, False on timeout."""
+        self._pending = False
+        # version is bumped before notify() checks _pending, so nothing slips between
+        if self.signal.version != self.last_version:
+            self.last_version = self.signal.version
+            return True
+        self.event.clear()
+        try:
+            await asyncio.wait_for(self.event.wait(), timeout)
+        except asyncio.TimeoutError:
+            return False
+        self.last_version = self.signal.version
+        return True
+
+    def close(self):
+        self.signal.unsubscribe(self)
+
+class ChangeSignal:
+    """
+    Lets engine threads wake asyncio consumers when state that matters for risk
+    or the dashboard changes, instead of consumers polling on a timer.
+    """
+
+    def __init__(self):
+        self.version = 0
+        self._subscribers = () # Copy-on-write, notify() never locks
+        self._lock = threading.Lock()
+
+    def notify(self):
+        self.version += 1
+        for subscription in self._subscribers:
+            subscription.notify()
+
+    def subscribe(self):
+        """Register an async consumer. Must be called from the event loop that will consume it."""
+        subscription = ChangeSubscription(self, asyncio.get_running_loop())
+        with self._lock:
+            self._subscribers = self._subscribers + (subscription,)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._subscribers = tuple(s for s in self._subscribers if s is not subscription)
 
 class SharedState:
     def __init__(self):
         self._lock = threading.Lock()
-        self.latest_frame = None  # JPEG bytes
+        self.frames = FrameChannel() # Frames (LazyFrame) of the primary camera, read without the state lock
+        self.camera_frames = {} # camera_id -> FrameChannel, for the cameras the vision engine runs
         self.people_count = 0
         self.risk_level = "SAFE"
-        self.audio_status = "NORMAL"
+        self.audio_status = "NORMAL" # PANIC if any zone is in panic
+        self.audio_zones = {} # zone -> "PANIC" / "NORMAL"
         self.last_update = time.time()
         self.zones = {} # Example: {"zone1": 5, "zone2": 10}
-        self.coordinates = [] # List of {"x": float, "y": float}
+        self.coordinates = CoordinateStore() # Venue-wide detections (all cameras)
+        self.cameras = {} # camera_id -> per-camera vision state
+        self.primary_camera = None # First camera to report, also published on `frames`
+        self._payload_cache = (-1, None) # (generation, encode_coordinates payload)
+        self._packed_cache = (-1, None) # (generation, pack_coordinates bytes)
+        self._binary_cache = (-1, None) # (generation, encode_coordinates_binary payload)
+        self.metrics = {} # engine name -> {metric: value}, e.g. vision skip ratio
+        self.changes = ChangeSignal() # Notified on vision results and audio status changes
+
+    def update_camera(self, camera_id, count, risk, coordinates=None, keypoints=None):
+        with self._lock:
+            self.cameras[camera_id] = {
+                "people_count": count,
+                "risk_level": risk,
+                "coordinates": coordinates if coordinates is not None else {},
+                "keypoints": keypoints, # (N, 17, 2) pixels, only while pose is requested
+                "last_update": time.time()
+            }
+            if self.primary_camera is None:
+                self.primary_camera = camera_id
+
+    def register_cameras(self, camera_ids):
+        """Cameras the vision engine runs; only these get a stream channel."""
+        with self._lock:
+            for camera_id in camera_ids:
+                self.camera_frames.setdefault(camera_id, FrameChannel())
 
-    def update_vision(self, frame_jpeg, count, risk, coordinates=[]):
+    def publish_frame(self, camera_id, frame):
+        """Publish a stream frame (LazyFrame) for one camera; the primary camera also feeds `frames`."""
+        channel = self.frame_channel(camera_id)
+        if channel is not None:
+            channel.publish(frame)
+        if camera_id == self.primary_camera:
+            self.frames.publish(frame)
+
+    def _aggregate_summary(self):
+        # Caller holds the lock. What consumers of a snapshot can see, minus coordinates
+        return (self.people_count, self.risk_level, tuple(
+            (camera_id, cam["people_count"], cam["risk_level"]) for camera_id, cam in self.cameras.items()
+        ))
+
+    def publish_aggregate(self):
+        """Fold per-camera state into the venue-wide fields; consumers are woken only on a change."""
+        with self._lock:
+            if not self.cameras:
+                return
+            previous = self._aggregate_summary()
+            _, previous_view = self.coordinates.view() # Still valid: publish writes the next slot
+            previous_rows = previous_view.tobytes()
+
+            self.coordinates.publish([cam["coordinates"] for cam in self.cameras.values()])
+            self.people_count = sum(cam["people_count"] for cam in self.cameras.values())
+            self.risk_level = max(
+                (cam["risk_level"] for cam in self.cameras.values()),
+                key=lambda r: RISK_ORDER.get(r, 0)
+            )
+            self.last_update = time.time()
+            changed = self._aggregate_summary() != previous or self.coordinates.view()[1].tobytes() != previous_rows
+        if changed:
+            self.changes.notify()
+
+    def update_audio_zones(self, zones):
         with self._lock:
-            self.latest_frame = frame_jpeg
-            self.people_count = count
-            self.risk_level = risk
-            self.coordinates = coordinates
+            changed = zones != self.audio_zones # Audio reports every hop; only transitions wake consumers
+            self.audio_zones = dict(zones)
+            self.audio_status = "PANIC" if "PANIC" in self.audio_zones.values() else "NORMAL"
             self.last_update = time.time()
+        if changed:
+            self.changes.notify()
+
+    def update_metrics(self, engine, values):
+        with self._lock:
+            self.metrics[engine] = values
 
-    def update_audio(self, status):
+    def get_metrics(self):
         with self._lock:
-            self.audio_status = status
-            self.last_update = time.time() # Or separate timestamp
+            return {engine: dict(values) for engine, values in self.metrics.items()}
 
-    def get_snapshot(self):
+    def get_coordinates(self):
+        """(generation, read-only struct array view) - no copy."""
         with self._lock:
+            return self.coordinates.view()
+
+    def _coordinates_payload(self):
+        # Caller holds the lock. Encoded once per generation, shared by every consumer.
+        generation, view = self.coordinates.view()
+        if self._payload_cache[0] != generation:
+            self._payload_cache = (generation, encode_coordinates(view, list(self.cameras)))
+        return self._payload_cache
+
+    def get_coordinates_packed(self):
+        """Binary detections for crowd_logs, packed at most once per generation."""
+        with self._lock:
+            generation, view = self.coordinates.view()
+            if self._packed_cache[0] != generation:
+                self._packed_cache = (generation, pack_coordinates(view))
+            return self._packed_cache[1]
+
+    def get_snapshot(self, coordinates="json"):
+        """
+        Current state. coordinates: "json" (columnar lists), "binary"
+        (encode_coordinates_binary) or None to leave them out.
+        """
+        with self._lock:
+            if coordinates == "json":
+                generation, payload = self._coordinates_payload()
+            elif coordinates == "binary":
+                generation, view = self.coordinates.view()
+                if self._binary_cache[0] != generation:
+                    self._binary_cache = (generation, encode_coordinates_binary(view, list(self.cameras)))
+                payload = self._binary_cache[1]
+            else:
+                generation, payload = self.coordinates.generation, None
             return {
                 "people_count": self.people_count,
                 "risk_level": self.risk_level,
                 "audio_status": self.audio_status,
-                "coordinates": self.coordinates,
+                "audio_zones": dict(self.audio_zones),
+                "coordinates": payload, # Shared between callers, treat as read-only
+                "generation": generation,
+                "cameras": {
+                    camera_id: {
+                        "people_count": cam["people_count"],
+                        "risk_level": cam["risk_level"]
+                    }
+                    for camera_id, cam in self.cameras.items()
+                },
                 "last_update": self.last_update
             }
 
-    def get_frame(self):
-        with self._lock:
-            return self.latest_frame
+    def frame_channel(self, camera_id=None):
+        """Channel for one camera (None if it is not a registered camera), or the primary stream when camera_id is None."""
+        if camera_id is None:
+            return self.frames
+        return self.camera_frames.get(camera_id)
+
+    def has_viewers(self, camera_id):
+        """True if anyone is subscribed to this camera's stream (or the primary stream it feeds)."""
+        channel = self.frame_channel(camera_id)
+        if channel is not None and channel.subscriber_count:
+            return True
+        is_primary = self.primary_camera in (None, camera_id)
+        return is_primary and self.frames.subscriber_count > 0
 
 # Global Singleton
 state = SharedState()
@@ -0,0 +1,66 @@
+import cv2
+import threading
+import numpy as np
+from engine.shared_state import state
+from engine.instrumentation import metrics
+from engine.vision.frame_encoder import LazyFrame
+
+BOX_COLOR = (0, 255, 0) # BGR
+LABEL_COLOR = (255, 255, 255)
+
+def draw_boxes(image, xyxy, count):
+    """Draw every detection box with a single polylines call plus a count label."""
+    if len(xyxy):
+        x1, y1, x2, y2 = xyxy.astype(np.int32).T
+        # (N, 4, 2) rectangle corners
+        corners = np.stack([
+            np.stack([x1, y1], axis=1),
+            np.stack([x2, y1], axis=1),
+            np.stack([x2, y2], axis=1),
+            np.stack([x1, y2], axis=1),
+        ], axis=1)
+        cv2.polylines(image, corners, True, BOX_COLOR, 2)
+    cv2.putText(image, f"People: {count}", (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 0.9, LABEL_COLOR, 2)
+    return image
+
+class AnnotationWorker(threading.Thread):
+    """
+    Optional pipeline stage: renders detections onto frames for the stream.
+    Inference hands off (frame, boxes) only when a camera has viewers; the worker
+    keeps just the newest job per camera, so a slow renderer drops stale frames
+    instead of holding up inference.
+    """
+
+    def __init__(self):
+        super().__init__(daemon=True, name="annotation")
+        self.running = False
+        self._jobs = {} # camera_id -> (frame, xyxy, count)
+        self._lock = threading.Lock()
+        self._pending = threading.Event()
+
+    def submit(self, camera_id, frame, xyxy, count):
+        with self._lock:
+            self._jobs[camera_id] = (frame, xyxy, count)
+        self._pending.set()
+
+    def run(self):
+        self.running = True
+        while self.running:
+            if not self._pending.wait(timeout=1.0):
+                continue
+            with self._lock:
+                jobs, self._jobs = self._jobs, {}
+                self._pending.clear()
+
+            for camera_id, (frame, xyxy, count) in jobs.items():
+                try:
+                    with metrics.time("annotate"):
+                        annotated = draw_boxes(frame, xyxy, count)
+                    state.publish_frame(camera_id, LazyFrame(annotated))
+                except Exception as e:
+                    metrics.increment("annotation_errors")
+                    print(f"[Annotator] Error rendering {camera_id}: {e}")
+
+    def stop(self):
+        self.running = False
+        self._pending.set()
@@ -0,0 +1,39 @@
+import cv2
+import threading
+from backend.core.config import STREAM_TIERS, STREAM_DEFAULT_TIER
+from engine.instrumentation import metrics
+
+def encode_tier(image, tier):
+    """JPEG-encode an image at the size/quality of a stream tier."""
+    max_width, quality = STREAM_TIERS[tier]
+    h, w = image.shape[:2]
+    if max_width and w > max_width:
+        image = cv2.resize(image, (max_width, int(h * max_width / w)), interpolation=cv2.INTER_AREA)
+    ret, buffer = cv2.imencode('.jpg', image, [cv2.IMWRITE_JPEG_QUALITY, quality])
+    return buffer.tobytes() if ret else None
+
+class LazyFrame:
+    """
+    Annotated frame published to the stream.
+    Nothing is encoded until a viewer asks for a tier; each tier is then encoded
+    at most once and shared by every viewer of that tier.
+    """
+
+    def __init__(self, image):
+        self.image = image
+        self._encoded = {}
+        self._lock = threading.Lock()
+
+    def cached(self, tier=STREAM_DEFAULT_TIER):
+        return self._encoded.get(tier)
+
+    def jpeg(self, tier=STREAM_DEFAULT_TIER):
+        data = self._encoded.get(tier)
+        if data is None:
+            with self._lock:
+                data = self._encoded.get(tier)
+                if data is None:
+                    with metrics.time("encode"):
+                        data = encode_tier(self.image, tier)
+                    self._encoded[tier] = data
+        return data
@@ -0,0 +1,125 @@
+import threading
+import collections
+import time
+import numpy as np
+from backend.core.config import (
+    HEATMAP_GRID, HEATMAP_HALF_LIFE_SECONDS, HEATMAP_MAP_BOUNDS,
+    HEATMAP_RESOLUTIONS, HEATMAP_PENDING_BUCKETS
+)
+
+MAP_KEY = "map" # Grid key of the venue-wide floor plan grid; camera grids use the camera id
+
+def grid_counts(xs, ys, size=HEATMAP_GRID, bounds=(0.0, 0.0, 1.0, 1.0)):
+    """Detections per cell as a (size, size) float32 grid (rows = y), one bincount for all points."""
+    min_x, min_y, max_x, max_y = bounds
+    xs = np.asarray(xs, dtype=np.float32)
+    ys = np.asarray(ys, dtype=np.float32)
+    valid = ~(np.isnan(xs) | np.isnan(ys))
+    gx = ((xs[valid] - min_x) / (max_x - min_x) * size).astype(np.int64)
+    gy = ((ys[valid] - min_y) / (max_y - min_y) * size).astype(np.int64)
+    inside = (gx >= 0) & (gx < size) & (gy >= 0) & (gy < size)
+    flat = gy[inside] * size + gx[inside]
+    return np.bincount(flat, minlength=size * size).astype(np.float32).reshape(size, size)
+
+def downsample(grid, res):
+    """Sum size x size cells into res x res (res must divide the grid size)."""
+    size = grid.shape[0]
+    block = size // res
+    return grid.reshape(res, block, res, block).sum(axis=(1, 3))
+
+class HeatmapAccumulator:
+    """
+    Occupancy grids built as frames are processed, per camera (normalized x/y)
+    and for the floor plan (homography map_x/map_y, MAP_KEY).
+    - A live grid per key decays with HEATMAP_HALF_LIFE_SECONDS, for "right now" views.
+    - Time buckets per key and resolution (HEATMAP_RESOLUTIONS) sum detections and
+      count frames; a bucket moves to `completed` when time rolls past it, where the
+      backend picks it up and persists it (backend/db/heatmaps.py).
+    Average occupancy of a cell over any range = sum(cells) / sum(samples).
+    """
+
+    def __init__(self, size=HEATMAP_GRID, half_life=HEATMAP_HALF_LIFE_SECONDS):
+        self.size = size
+        self.half_life = half_life
+        self._live = {} # key -> (grid, last update time)
+        self._open = {} # (key, resolution) -> [bucket start (epoch s), grid, samples]
+        self.completed = collections.deque(maxlen=HEATMAP_PENDING_BUCKETS) # (key, resolution, start, grid, samples)
+        self._lock = threading.Lock()
+
+    def add(self, key, xs, ys, bounds=(0.0, 0.0, 1.0, 1.0), now=None):
+        """One processed frame's detections for one grid."""
+        now = time.time() if now is None else now
+        counts = grid_counts(xs, ys, self.size, bounds)
+        with self._lock:
+            grid, last = self._live.get(key, (None, now))
+            if grid is None:
+                grid = counts
+            else:
+                grid *= 0.5 ** ((now - last) / self.half_life)
+                grid += counts
+            self._live[key] = (grid, now)
+
+            for resolution, seconds in HEATMAP_RESOLUTIONS.items():
+                start = now - now % seconds
+                bucket = self._open.get((key, resolution))
+                if bucket is None or bucket[0] != start:
+                    if bucket is not None:
+                        self.completed.append((key, resolution, *bucket))
+                    bucket = self._open[(key, resolution)] = [start, np.zeros_like(counts), 0]
+                bucket[1] += counts
+                bucket[2] += 1
+
+    def add_batch(self, camera_coordinates, now=None):
+        """Columnar coordinates per camera ({camera_id: {"x": ..., "map_x": ...}}) from one batch."""
+        now = time.time() if now is None else now
+        map_x, map_y = [], []
+        for camera_id, coordinates in camera_coordinates.items():
+            if "x" not in coordinates:
+                continue
+            self.add(camera_id, coordinates["x"], coordinates["y"], now=now)
+            if "map_x" in coordinates:
+                map_x.append(coordinates["map_x"])
+                map_y.append(coordinates["map_y"])
+        if map_x:
+            self.add(MAP_KEY, np.concatenate(map_x), np.concatenate(map_y), HEATMAP_MAP_BOUNDS, now)
+
+    def live_grid(self, key, now=None):
+        """Decayed live grid for key (copy), or None."""
+        now = time.time() if now is None else now
+        with self._lock:
+            entry = self._live.get(key)
+            if entry is None:
+                return None
+            grid, last = entry
+            return grid * 0.5 ** ((now - last) / self.half_life)
+
+    def pending(self, key, resolution):
+        """Buckets not persisted yet (completed + open) as [(start, grid copy, samples)]."""
+        with self._lock:
+            buckets = [(s, g.copy(), n) for k, r, s, g, n in self.completed if k == key and r == resolution]
+            bucket = self._open.get((key, resolution))
+            if bucket is not None:
+                buckets.append((bucket[0], bucket[1].copy(), bucket[2]))
+        return buckets
+
+    def pop_completed(self, include_open=False):
+        """Take completed buckets for persisting; include_open also closes the current ones (shutdown)."""
+        with self._lock:
+            if include_open:
+                for (key, resolution), bucket in self._open.items():
+                    self.completed.append((key, resolution, *bucket))
+                self._open.clear()
+            items = list(self.completed)
+            self.completed.clear()
+        return items
+
+    def requeue(self, items):
+        """Put buckets that failed to persist back, oldest first. Over the bound, the oldest are lost."""
+        with self._lock:
+            merged = list(items) + list(self.completed)
+            self.completed.clear()
+            self.completed.extend(merged) # maxlen evicts from the left: the oldest buckets
+        return max(0, len(merged) - self.completed.maxlen)
+
+# Global Singleton
+heatmaps = HeatmapAccumulator()
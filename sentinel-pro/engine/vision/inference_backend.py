@@ -0,0 +1,111 @@
+import os
+import time
+import shutil
+import hashlib
+import importlib.util
+import numpy as np
+from ultralytics import YOLO
+from backend.core.config import IMG_SIZE, MODELS_DIR, INFERENCE_BACKEND
+
+MODEL_CACHE_DIR = os.path.join(MODELS_DIR, "cache")
+
+# Export format per CPU runtime (ultralytics export names)
+EXPORT_FORMATS = {"openvino": "openvino", "onnx": "onnx"}
+# Python package that has to be importable for each runtime
+RUNTIME_PACKAGES = {"openvino": "openvino", "onnx": "onnxruntime", "torch": "torch"}
+
+def cuda_available():
+    try:
+        import torch
+        return torch.cuda.is_available()
+    except ImportError:
+        return False
+
+def model_hash(path, chunk_size=1 << 20):
+    """Short content hash of a weights file, so a retrained .pt never hits a stale export."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()[:16]
+
+def available_backends():
+    """CPU runtimes that are installed, in preference order."""
+    return [name for name in ("openvino", "onnx", "torch") if importlib.util.find_spec(RUNTIME_PACKAGES[name])]
+
+def cached_export(weights_path, backend):
+    """
+    Path of weights_path exported for `backend`, exporting on first use.
+    Cache layout: models/cache/<stem>-<hash>-<imgsz>/<export artifact>
+    """
+    if not os.path.exists(weights_path):
+        YOLO(weights_path) # Downloads official weights on first use
+    stem = os.path.splitext(os.path.basename(weights_path))[0]
+    cache_dir = os.path.join(MODEL_CACHE_DIR, f"{stem}-{model_hash(weights_path)}-{IMG_SIZE}")
+    target = os.path.join(cache_dir, f"{stem}_openvino_model" if backend == "openvino" else f"{stem}.onnx")
+    if os.path.exists(target):
+        return target
+
+    print(f"[Inference] Exporting {weights_path} to {backend} (imgsz={IMG_SIZE}), one-time cost...")
+    # dynamic=True keeps the batch axis free for multi-camera batches
+    exported = YOLO(weights_path).export(format=EXPORT_FORMATS[backend], imgsz=IMG_SIZE, dynamic=True)
+    os.makedirs(cache_dir, exist_ok=True)
+    shutil.move(str(exported), target)
+    return target
+
+def load_backend(weights_path, backend):
+    """Load weights on a given runtime. Returns a YOLO object with the usual call API."""
+    if backend == "tensorrt":
+        return YOLO(weights_path.replace(".pt", ".engine"))
+    if backend in EXPORT_FORMATS:
+        task = "pose" if "pose" in os.path.basename(weights_path) else "detect"
+        return YOLO(cached_export(weights_path, backend), task=task)
+    return YOLO(weights_path)
+
+def benchmark(model, runs=3):
+    """Median seconds per call on a blank frame (first call is warm-up)."""
+    frame = np.zeros((IMG_SIZE, IMG_SIZE, 3), dtype=np.uint8)
+    model(frame, verbose=False, imgsz=IMG_SIZE)
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        model(frame, verbose=False, imgsz=IMG_SIZE)
+        timings.append(time.perf_counter() - start)
+    return sorted(timings)[len(timings) // 2]
+
+def select_backend(weights_path):
+    """
+    Pick the inference runtime for weights_path.
+    Returns (model, backend name, half precision flag).
+    INFERENCE_BACKEND forces a runtime; "auto" uses TensorRT/CUDA when a GPU is present,
+    otherwise benchmarks the installed CPU runtimes and keeps the fastest.
+    """
+    if cuda_available():
+        engine_path = weights_path.replace(".pt", ".engine")
+        if INFERENCE_BACKEND in ("auto", "tensorrt") and os.path.exists(engine_path):
+            return load_backend(weights_path, "tensorrt"), "tensorrt", True
+        if INFERENCE_BACKEND in ("auto", "torch"):
+            return YOLO(weights_path), "torch-cuda", True
+
+    candidates = available_backends()
+    if INFERENCE_BACKEND != "auto":
+        candidates = [INFERENCE_BACKEND] if INFERENCE_BACKEND in candidates else []
+        if not candidates:
+            print(f"[Inference] Backend '{INFERENCE_BACKEND}' is not installed, using torch")
+            candidates = ["torch"]
+
+    best = None
+    for backend in candidates:
+        try:
+            model = load_backend(weights_path, backend)
+            seconds = benchmark(model) if len(candidates) > 1 else 0.0
+        except Exception as e:
+            print(f"[Inference] {backend} unavailable: {e}")
+            continue
+        print(f"[Inference] {backend}: {seconds * 1000:.1f} ms/frame")
+        if best is None or seconds < best[2]:
+            best = (model, backend, seconds)
+
+    if best is None:
+        return YOLO(weights_path), "torch", False
+    return best[0], best[1], False
@@ -0,0 +1,103 @@
+import time
+import threading
+from backend.core.config import (
+    VISION_LATENCY_BUDGET_MS, VISION_IDLE_BUDGET_MS,
+    VISION_ACTIVITY_DELTA, VISION_STATIC_FRAMES
+)
+
+class AdaptiveScheduler:
+    """
+    Decides which cameras' frames go through inference.
+    Keeps moving averages of the camera frame interval (reported by the capture
+    producers) and of inference time, and a target interval between inferred
+    frames of one camera that:
+      - is zero (every frame) while the count is changing quickly or risk is HIGH,
+      - meets VISION_LATENCY_BUDGET_MS in a normal scene,
+      - relaxes to VISION_IDLE_BUDGET_MS once the scene is static.
+    Due-ness is tracked per camera, so skipping never starves one camera, and a
+    camera that is almost due joins the batch of one that is, which keeps
+    cameras in phase for batched inference.
+    Frames that arrive while inference is busy are already dropped by each camera's
+    latest-frame slot, so the target never needs to account for inference speed.
+    """
+
+    def __init__(self, smoothing=0.2):
+        self.smoothing = smoothing
+        self.arrival_interval = None # seconds between frames of one camera (EMA)
+        self.inference_time = None # seconds per batch (EMA)
+        self._last_arrival = {} # camera_id -> monotonic time of its previous frame
+        self._arrival_lock = threading.Lock() # note_arrival runs on every capture thread
+        self._last_processed = {} # camera_id -> monotonic time its last frame was inferred
+        self.target_interval = 0.0 # seconds between inferred frames of one camera
+        self._arrived = 0 # Frames delivered / inferred since the last record()
+        self._processed = 0
+        self.skip_ratio = 0.0 # EMA of skipped / delivered frames
+        self.last_count = None
+        self.static_frames = 0
+        self.mode = "normal" # active | normal | idle
+
+    def _ema(self, current, sample):
+        return sample if current is None else current + self.smoothing * (sample - current)
+
+    def note_arrival(self, camera_id):
+        """Called by a capture producer for every frame it delivers."""
+        now = time.monotonic()
+        with self._arrival_lock:
+            last = self._last_arrival.get(camera_id)
+            if last is not None:
+                self.arrival_interval = self._ema(self.arrival_interval, now - last)
+            self._last_arrival[camera_id] = now
+            self._arrived += 1
+
+    def due(self, camera_id, now, slack=False):
+        """
+        True if the camera's latest frame should be inferred now: waiting for its next
+        frame would overshoot the target. slack=True also accepts cameras due within
+        one more frame, to batch them with a camera that is due.
+        """
+        last = self._last_processed.get(camera_id)
+        if last is None or self.target_interval <= 0:
+            return True
+        frame = self.arrival_interval or 0.0
+        return now - last + frame * (2 if slack else 1) > self.target_interval
+
+    def processed(self, camera_ids, now):
+        """Mark the cameras of an inferred batch."""
+        for camera_id in camera_ids:
+            self._last_processed[camera_id] = now
+        self._processed += len(camera_ids)
+
+    def record(self, inference_seconds, count, risk):
+        """Feed back the cost and outcome of a processed batch and retune the target interval."""
+        self.inference_time = self._ema(self.inference_time, inference_seconds)
+        with self._arrival_lock:
+            if self._arrived:
+                skipped = max(self._arrived - self._processed, 0) / self._arrived
+                self.skip_ratio = self._ema(self.skip_ratio, skipped)
+            self._arrived = self._processed = 0
+
+        delta = abs(count - self.last_count) if self.last_count is not None else 0
+        self.static_frames = self.static_frames + 1 if delta == 0 else 0
+        self.last_count = count
+
+        if risk == "HIGH" or delta >= VISION_ACTIVITY_DELTA:
+            self.mode = "active"
+        elif self.static_frames >= VISION_STATIC_FRAMES:
+            self.mode = "idle"
+        else:
+            self.mode = "normal"
+
+        if self.mode == "active":
+            self.target_interval = 0.0
+        else:
+            budget_ms = VISION_IDLE_BUDGET_MS if self.mode == "idle" else VISION_LATENCY_BUDGET_MS
+            self.target_interval = budget_ms / 1000.0
+
+    def metrics(self):
+        return {
+            "skip_ratio": round(self.skip_ratio, 3),
+            "interval_ms": round(self.target_interval * 1000, 1),
+            "mode": self.mode,
+            "inference_ms": round((self.inference_time or 0.0) * 1000, 1),
+            "camera_fps": round(1.0 / self.arrival_interval, 1) if self.arrival_interval else 0.0
+        }
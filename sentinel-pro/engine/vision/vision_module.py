@@ -3,177 +3,414 @@ import threading
 import time
 import queue
 import os
-from ultralytics import YOLO
+import numpy as np
 from engine.shared_state import state
-from backend.core.config import YOLO_MODEL, CROWD_DENSITY_HIGH, CROWD_DENSITY_MEDIUM, IMG_SIZE
+from engine.instrumentation import metrics
+from engine.vision.annotator import AnnotationWorker
+from engine.vision.scheduler import AdaptiveScheduler
+from engine.vision.heatmap import heatmaps
+from engine.vision.inference_backend import select_backend
+from backend.core.config import (
+    YOLO_MODEL, YOLO_POSE_MODEL, POSE_ENABLED, CONF_THRESHOLD, IOU_THRESHOLD,
+    CROWD_DENSITY_HIGH, CROWD_DENSITY_MEDIUM, IMG_SIZE,
+    REPLAY_PACING, REPLAY_LOOP
+)
 
-class VisionEngine(threading.Thread):
-    def __init__(self, source=None):
-        super().__init__()
-        # Use env var if source not provided, parse as int if digit (webcam), else string (RTSP)
-        if source is None:
-            env_source = os.getenv("CAMERA_SOURCE", "0")
-            if env_source.isdigit():
-                self.source = int(env_source)
-            else:
-                self.source = env_source
-        else:
-            self.source = source
-            
-        self.running = False
-        self.model = None
+def parse_sources(env_value):
+    """Parse CAMERA_SOURCE ("0", "rtsp://...", or a comma separated mix) into a list."""
+    sources = []
+    for item in env_value.split(","):
+        item = item.strip()
+        if not item:
+            continue
+        # parse as int if digit (webcam), else string (RTSP)
+        sources.append(int(item) if item.isdigit() else item)
+    return sources or [0]
+
+class CameraSource:
+    """
+    Producer: owns one cv2.VideoCapture and keeps only its latest frame.
+    A video file is treated as a replay: it is paced according to `pacing`
+    (realtime: native FPS, fast: as fast as inference takes frames, step: one
+    frame per step()) and the source finishes at end of file instead of reconnecting.
+    """
+
+    def __init__(self, camera_id, source, frame_ready, pacing=REPLAY_PACING, loop=REPLAY_LOOP, scheduler=None):
+        self.camera_id = camera_id
+        self.source = source
         self.frame_queue = queue.Queue(maxsize=1) # Keep only latest frame
-        self.capture_thread = None
-        self.homography_matrix = None # Numpy array for coord transformation
+        self.frame_ready = frame_ready # Shared event, wakes the inference consumer
+        self.scheduler = scheduler # Told about every frame, so it knows the camera's real rate
+        self.running = False
+        self.thread = None
 
-    def set_homography(self, matrix_list):
+        self.replay = isinstance(source, str) and os.path.isfile(source)
+        self.pacing = pacing if self.replay else "realtime"
+        self.loop = loop
+        self.finished = False # Replay reached end of file
+        self.frames_read = 0
+        self.step_permits = threading.Semaphore(0)
+
+    def start(self):
+        self.running = True
+        self.thread = threading.Thread(target=self.capture_loop, daemon=True, name=f"capture-{self.camera_id}")
+        self.thread.start()
+
+    def stop(self):
+        self.running = False
+        self.step_permits.release() # Unblock a stepping producer
+        if self.thread:
+            self.thread.join(timeout=1)
+
+    def latest(self, timeout=None):
+        """Latest frame since last call, or None. Non-blocking unless timeout is given."""
         try:
-            self.homography_matrix = np.array(matrix_list, dtype=np.float32)
-            print("[VisionEngine] Homography Matrix Updated")
-        except Exception as e:
-            print(f"[VisionEngine] Error setting homography: {e}")
+            if timeout is None:
+                return self.frame_queue.get_nowait()
+            return self.frame_queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def deliver(self, frame):
+        if self.scheduler is not None:
+            self.scheduler.note_arrival(self.camera_id)
+        if self.pacing in ("fast", "step"):
+            # Replay: never drop, wait for inference to take the previous frame
+            while self.running:
+                try:
+                    self.frame_queue.put(frame, timeout=0.1)
+                    break
+                except queue.Full:
+                    continue
+        else:
+            # Put frame in queue (drop old if full)
+            if self.frame_queue.full():
+                try:
+                    self.frame_queue.get_nowait()
+                except queue.Empty:
+                    pass
+            self.frame_queue.put(frame)
+        self.frame_ready.set()
 
     def capture_loop(self):
-        """Producer: Reads frames as fast as possible."""
+        """Reads frames as fast as possible (live) or at the replay pace (file)."""
         while self.running:
-            print(f"[VisionEngine] Attempting to open Source: {self.source}")
-            
+            print(f"[VisionEngine:{self.camera_id}] Attempting to open Source: {self.source}")
+
             # On Windows, using CAP_DSHOW can sometimes verify webcam access better for index 0
             if isinstance(self.source, int):
                 cap = cv2.VideoCapture(self.source, cv2.CAP_DSHOW)
             else:
                 cap = cv2.VideoCapture(self.source)
-            
+
             if not cap.isOpened():
-                print(f"[VisionEngine] ERROR: Could not open source {self.source}. Retrying in 5s...")
+                print(f"[VisionEngine:{self.camera_id}] ERROR: Could not open source {self.source}. Retrying in 5s...")
                 time.sleep(5)
                 continue
-            
-            print(f"[VisionEngine] Source {self.source} opened successfully.")
-            
+
+            print(f"[VisionEngine:{self.camera_id}] Source {self.source} opened successfully.")
+            fps = cap.get(cv2.CAP_PROP_FPS) or 25.0
+            frame_count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT) or 0)
+            started = time.monotonic()
+            index = 0
+
             while self.running and cap.isOpened():
-                ret, frame = cap.read()
+                if self.pacing == "step":
+                    self.step_permits.acquire()
+                    if not self.running:
+                        break
+
+                with metrics.time("capture"):
+                    ret, frame = cap.read()
                 if not ret:
-                    print("[VisionEngine] WARN: Failed to read frame (stream ended or disconnected). Reconnecting...")
+                    if self.replay and self.loop:
+                        cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+                        started, index = time.monotonic(), 0
+                        continue
+                    if self.replay:
+                        print(f"[VisionEngine:{self.camera_id}] Replay finished after {self.frames_read} frames.")
+                        self.finished = True
+                        self.running = False
+                        self.frame_ready.set()
+                        break
+                    print(f"[VisionEngine:{self.camera_id}] WARN: Failed to read frame (stream ended or disconnected). Reconnecting...")
+                    break
+
+                if self.replay and self.pacing == "realtime":
+                    delay = started + index / fps - time.monotonic()
+                    if delay > 0:
+                        time.sleep(delay)
+                index += 1
+                self.frames_read += 1
+                self.deliver(frame)
+
+                # Stepped replays would only see end of file on the next step(): check the frame count
+                if self.replay and not self.loop and self.pacing == "step" and index >= frame_count > 0:
+                    print(f"[VisionEngine:{self.camera_id}] Replay finished after {self.frames_read} frames.")
+                    self.finished = True
+                    self.running = False
+                    self.frame_ready.set()
                     break
-                
-                # Put frame in queue (drop old if full)
-                if self.frame_queue.full():
-                    try:
-                        self.frame_queue.get_nowait()
-                    except queue.Empty:
-                        pass
-                
-                self.frame_queue.put(frame)
-                
-                # Sleep slightly to prevent CPU hogging if source is very fast (optional)
-                # time.sleep(0.001)
 
             cap.release()
-            print("[VisionEngine] Capture stopped or disconnected.")
-            
+            print(f"[VisionEngine:{self.camera_id}] Capture stopped or disconnected.")
+
             if self.running:
-                print("[VisionEngine] Waiting 2s before retry...")
+                print(f"[VisionEngine:{self.camera_id}] Waiting 2s before retry...")
                 time.sleep(2)
 
+class VisionEngine(threading.Thread):
+    """
+    One capture producer per camera, one inference consumer.
+    The consumer stacks the latest frame of every camera into a single batched
+    YOLO call and fans the results back out into per-camera state.
+    """
+
+    def __init__(self, source=None, sources=None):
+        super().__init__()
+        # Use env var if no source provided (comma separated for multiple cameras)
+        if sources is None:
+            if source is None:
+                sources = parse_sources(os.getenv("CAMERA_SOURCE", "0"))
+            else:
+                sources = [source]
+        self.sources = list(sources)
+        self.source = self.sources[0] # Primary camera (kept for single-camera callers)
+
+        self.running = False
+        self.model = None
+        self.backend = None # Active inference runtime (openvino, onnx, torch, ...)
+        self.half = False # FP16 only pays off on GPU runtimes
+        self.weights = None # Weights currently loaded (YOLO_MODEL or YOLO_POSE_MODEL)
+        self._loaded = {} # weights -> (model, backend, half), so toggling pose never reloads
+        self._loading = set() # Weights being loaded on a background thread
+        self._load_failed = set() # Weights that could not be loaded, not retried
+        self.pose_consumers = {"config"} if POSE_ENABLED else set() # Features that need keypoints
+        self.frame_ready = threading.Event()
+        self.scheduler = AdaptiveScheduler() # Decides which batches are worth inferring
+        self.cameras = [
+            CameraSource(f"cam{i}", src, self.frame_ready, scheduler=self.scheduler)
+            for i, src in enumerate(self.sources)
+        ]
+        state.register_cameras([cam.camera_id for cam in self.cameras]) # Stream channels for these ids only
+        self.homography_matrix = None # Numpy array for coord transformation
+        self.annotator = AnnotationWorker() # Renders boxes for the stream, off the inference path
+        # Replays paced "fast" or "step" must see every frame (capacity tests, regressions)
+        self.process_every_frame = any(cam.pacing in ("fast", "step") for cam in self.cameras)
+        self.replay_done = threading.Event() # Set once every replayed source hit end of file
+        self.frames_processed = 0
+
+    def set_homography(self, matrix_list):
+        try:
+            self.homography_matrix = np.array(matrix_list, dtype=np.float32)
+            print("[VisionEngine] Homography Matrix Updated")
+        except Exception as e:
+            print(f"[VisionEngine] Error setting homography: {e}")
+
+    def request_pose(self, consumer, enabled=True):
+        """
+        Register (or release) a feature that needs pose keypoints.
+        The pose model runs only while at least one consumer is registered;
+        the switch happens on the inference thread before the next batch.
+        """
+        if enabled:
+            self.pose_consumers.add(consumer)
+        else:
+            self.pose_consumers.discard(consumer)
+
+    def load_weights(self, weights):
+        print(f"[VisionEngine] Loading Model: {weights}")
+        # Exported ONNX/OpenVINO weights are cached on disk, so only the first start pays for export
+        self._loaded[weights] = select_backend(weights)
+
+    def preload(self, weights):
+        """Load weights (export + backend benchmark on first use) on a background thread."""
+        if weights in self._loaded or weights in self._loading or weights in self._load_failed:
+            return
+        self._loading.add(weights)
+        threading.Thread(target=self._preload, args=(weights,), daemon=True, name=f"load-{weights}").start()
+
+    def _preload(self, weights):
+        try:
+            self.load_weights(weights)
+        except Exception as e:
+            self._load_failed.add(weights)
+            print(f"[VisionEngine] Loading {weights} failed: {e}")
+        finally:
+            self._loading.discard(weights)
+
+    def ensure_model(self, wait=False):
+        """
+        Switch to the detection or pose model, depending on current consumers.
+        Weights that are not loaded yet load in the background and detection keeps
+        running on the current model until they are ready; with wait=True (or no
+        model at all yet) they are loaded right here.
+        """
+        weights = YOLO_POSE_MODEL if self.pose_consumers else YOLO_MODEL
+        if weights == self.weights:
+            return
+        if weights not in self._loaded:
+            if not wait and self.model is not None:
+                self.preload(weights)
+                return
+            self.load_weights(weights)
+        self.model, self.backend, self.half = self._loaded[weights]
+        self.weights = weights
+        print(f"[VisionEngine] Active model: {weights} (backend: {self.backend})")
+
+    def step(self, frames=1):
+        """Replay with pacing "step": let every camera read `frames` more frames."""
+        for cam in self.cameras:
+            for _ in range(frames):
+                cam.step_permits.release()
+
+    def collect_batch(self):
+        """
+        Latest frame of every camera that is due (AdaptiveScheduler.due), batched with
+        cameras that are nearly due. Cameras that are not due keep their frame queued.
+        """
+        cameras = self.cameras
+        if not self.process_every_frame:
+            now = time.monotonic()
+            ready = [cam for cam in cameras if not cam.frame_queue.empty()]
+            if not any(self.scheduler.due(cam.camera_id, now) for cam in ready):
+                return []
+            cameras = [cam for cam in ready if self.scheduler.due(cam.camera_id, now, slack=True)]
+
+        batch = []
+        for cam in cameras:
+            frame = cam.latest()
+            # Stepped replays wait for every camera so batches are deterministic
+            while frame is None and cam.pacing == "step" and cam.running and not cam.finished:
+                frame = cam.latest(timeout=0.1)
+            if frame is not None:
+                batch.append((cam.camera_id, frame))
+        return batch
+
+    def process_result(self, frame, r):
+        """Turn one YOLO result into (count, status, xyxy boxes, coordinates)."""
+        # One device->host transfer for the whole box tensor: (N, 4) center_x, center_y, width, height
+        xywh = r.boxes.xywh.cpu().numpy().astype(np.float32, copy=False)
+        person_count = len(xywh)
+
+        # Corner boxes for the annotation stage
+        centers = xywh[:, :2]
+        half_size = xywh[:, 2:] / 2
+        xyxy = np.hstack([centers - half_size, centers + half_size])
+
+        # Coordinates for heatmap (centroids), columnar: one array per field
+        frame_h, frame_w = frame.shape[:2]
+        # Normalize coordinates (0-1) for heatmap grid
+        norm = centers / np.array([frame_w, frame_h], dtype=np.float32)
+
+        coordinates = {
+            "x": norm[:, 0],
+            "y": norm[:, 1],
+            "pixel_x": centers[:, 0],
+            "pixel_y": centers[:, 1]
+        }
+
+        # Apply Homography if available (single call for all points)
+        if self.homography_matrix is not None:
+            if person_count:
+                try:
+                    # perspectiveTransform expects shape (1, N, 2)
+                    mapped = cv2.perspectiveTransform(centers.reshape(1, -1, 2), self.homography_matrix)[0]
+                    coordinates["map_x"] = mapped[:, 0]
+                    coordinates["map_y"] = mapped[:, 1]
+                except Exception as e:
+                    print(f"Transform Error: {e}")
+            else:
+                coordinates["map_x"] = coordinates["map_y"] = np.empty(0, dtype=np.float32)
+
+        # Determine Status
+        if person_count >= CROWD_DENSITY_HIGH:
+            status = "HIGH"
+        elif person_count >= CROWD_DENSITY_MEDIUM:
+            status = "MEDIUM"
+        else:
+            status = "LOW"
+
+        return person_count, status, xyxy, coordinates
+
     def run(self):
         """Consumer: Inference Loop"""
-        print(f"[VisionEngine] Loading Model (TensorRT preferred): {YOLO_MODEL}")
-        
-        # Check for TensorRT engine
-        model_path = YOLO_MODEL
-        if YOLO_MODEL.endswith('.pt'):
-            engine_path = YOLO_MODEL.replace('.pt', '.engine')
-            # Logic to check if engine exists would go here
-            # model_path = engine_path if os.path.exists(engine_path) else YOLO_MODEL
-        
-        self.model = YOLO(model_path)
+        self.ensure_model(wait=True)
         self.running = True
-        
-        # Start Producer
-        self.capture_thread = threading.Thread(target=self.capture_loop, daemon=True)
-        self.capture_thread.start()
-        
-        frame_counter = 0
-        
-        import numpy as np # Ensure numpy is available in scope or global
-        
+
+        # Start Producers
+        print(f"[VisionEngine] Starting {len(self.cameras)} camera source(s)")
+        for cam in self.cameras:
+            cam.start()
+        self.annotator.start()
+
         while self.running:
-            try:
-                # Wait for frame (blocking)
-                frame = self.frame_queue.get(timeout=1.0)
-            except queue.Empty:
-                continue
+            # Wait for any camera to deliver a frame; on timeout, frames left queued may have become due
+            if self.frame_ready.wait(timeout=0.5):
+                self.frame_ready.clear()
 
-            frame_counter += 1
-            
-            # Frame Skipping (Every 2nd frame)
-            if frame_counter % 2 != 0:
-                continue
+            # Adaptive frame skipping (latency budget, scene activity), per camera
+            batch = self.collect_batch()
+            if batch:
+                self.process_batch(batch)
+            self.check_replay_done()
 
-            # Inference
-            results = self.model(frame, verbose=False, classes=[0], imgsz=IMG_SIZE, half=True)
-            
-            person_count = 0
-            
-            for r in results:
-                person_count = len(r.boxes)
-            
-            # Draw Bounding Boxes on the frame
-            annotated_frame = results[0].plot()
-
-            # Coordinates for heatmap (centroids)
-            coordinates = []
-            for r in results:
-                for box in r.boxes:
-                    # box.xywh returns center_x, center_y, width, height
-                    x, y, w, h = box.xywh[0].tolist() 
-                    
-                    # Normalize coordinates (0-1) for heatmap grid
-                    norm_x = x / frame.shape[1]
-                    norm_y = y / frame.shape[0]
-                    
-                    coord_enrty = {
-                        "x": norm_x, 
-                        "y": norm_y,
-                        "pixel_x": x,
-                        "pixel_y": y
-                    }
-
-                    # Apply Homography if available
-                    if self.homography_matrix is not None:
-                        # perspectiveTransform expects shape (1, N, 2)
-                        pt = np.array([[[x, y]]], dtype=np.float32)
-                        try:
-                            dst = cv2.perspectiveTransform(pt, self.homography_matrix)
-                            map_x = dst[0][0][0]
-                            map_y = dst[0][0][1]
-                            coord_enrty["map_x"] = float(map_x)
-                            coord_enrty["map_y"] = float(map_y)
-                        except Exception as e:
-                            print(f"Transform Error: {e}")
-
-                    coordinates.append(coord_enrty)
-
-            # Determine Status
-            if person_count >= CROWD_DENSITY_HIGH:
-                status = "HIGH"
-            elif person_count >= CROWD_DENSITY_MEDIUM:
-                status = "MEDIUM"
-            else:
-                status = "LOW"
-
-            # Encode to JPEG for streaming
-            ret, buffer = cv2.imencode('.jpg', annotated_frame)
-            if ret:
-                jpg_bytes = buffer.tobytes()
-                # Update Shared State
-                state.update_vision(jpg_bytes, person_count, status, coordinates)
-            
-            # Log FPS (Optional)
-            # print(f"FPS: ...")
+    def check_replay_done(self):
+        """Finish once every source is a replay that hit end of file and its last frame was taken."""
+        if all(cam.finished and cam.frame_queue.empty() for cam in self.cameras):
+            print(f"[VisionEngine] Replay complete ({self.frames_processed} batches processed)")
+            self.replay_done.set()
+            self.running = False
+
+    def process_batch(self, batch):
+        """Run one batched inference over [(camera_id, frame), ...] and publish the results."""
+        # Switch between detection and pose models if consumers changed
+        self.ensure_model()
+        self.scheduler.processed([camera_id for camera_id, _ in batch], time.monotonic())
+
+        # Batched Inference (one call for all cameras)
+        frames = [frame for _, frame in batch]
+        with metrics.time("inference") as inference:
+            results = self.model(
+                frames, verbose=False, classes=[0], imgsz=IMG_SIZE, half=self.half,
+                conf=CONF_THRESHOLD, iou=IOU_THRESHOLD
+            )
+
+        # Fan results back out per camera
+        total_count = 0
+        statuses = []
+        batch_coordinates = {}
+        for (camera_id, frame), r in zip(batch, results):
+            with metrics.time("postprocess"):
+                person_count, status, xyxy, coordinates = self.process_result(frame, r)
+                # Keypoints only exist while the pose model is active
+                keypoints = r.keypoints.xy.cpu().numpy() if r.keypoints is not None else None
+            with metrics.time("publish"):
+                state.update_camera(camera_id, person_count, status, coordinates, keypoints)
+            total_count += person_count
+            statuses.append(status)
+            batch_coordinates[camera_id] = coordinates
+
+            # Drawing and JPEG encoding only happen when somebody is watching
+            if state.has_viewers(camera_id):
+                self.annotator.submit(camera_id, frame, xyxy, person_count)
+
+        # Occupancy grids (live decaying + time buckets) for the heatmap endpoint
+        with metrics.time("heatmap"):
+            heatmaps.add_batch(batch_coordinates)
+
+        # Publish venue-wide aggregate
+        with metrics.time("publish"):
+            state.publish_aggregate()
+        self.frames_processed += 1
+
+        self.scheduler.record(inference.seconds, total_count, "HIGH" if "HIGH" in statuses else None)
+        state.update_metrics("vision", {
+            **self.scheduler.metrics(), "backend": self.backend, "model": self.weights
+        })
 
     def stop(self):
         self.running = False
-        if self.capture_thread:
-            self.capture_thread.join(timeout=1)
+        self.annotator.stop()
+        for cam in self.cameras:
+            cam.stop()
@@ -6,6 +6,24 @@ import TrendAnalysisChart from '../components/TrendAnalysisChart';
 import PeakHourChart from '../components/PeakHourChart';
 import ErrorBoundary from '../components/ErrorBoundary';
 
+// Binary coordinates: x/y are uint16 quantized to 0..1 (little-endian, one attachment per field)
+const decodeCoordinates = (coords) => {
+    if (!coords || !coords.n) return { x: [], y: [] };
+    const unquantize = (buf) => Array.from(new Uint16Array(buf), (v) => v / 65535);
+    return { x: unquantize(coords.x), y: unquantize(coords.y) };
+};
+
+// Simple grid mapping 10x10
+const buildGrid = ({ x, y }) => {
+    const grid = new Array(10).fill(0).map(() => new Array(10).fill(0));
+    x.forEach((cx, i) => {
+        const gx = Math.min(Math.floor(cx * 10), 9); // 0-9
+        const gy = Math.min(Math.floor(y[i] * 10), 9); // 0-9
+        grid[gy][gx] += 1;
+    });
+    return grid;
+};
+
 // Ensure this matches your backend URL. If simple CORS is used, strict localhost:8000 is fine.
 const socket = io('http://localhost:8000');
 
@@ -15,13 +33,15 @@ function DashboardContent() {
         people_count: 0,
         risk_level: 'LOW',
         audio_status: 'NORMAL',
-        coordinates: []
+        coordinates: {}
     });
     const [logs, setLogs] = useState([]);
     const [peakHourData, setPeakHourData] = useState([]);
     const [trendData, setTrendData] = useState([]);
     const [heatmapData, setHeatmapData] = useState(new Array(10).fill(0).map(() => new Array(10).fill(0)));
     const [anomalyAlert, setAnomalyAlert] = useState(null);
+    const stateRef = useRef({});
+    const seqRef = useRef(0);
 
     useEffect(() => {
         const token = localStorage.getItem('token');
@@ -30,22 +50,21 @@ function DashboardContent() {
         }
 
         // Socket Listener
-        socket.on('connect', () => console.log("Connected to WebSocket"));
-        socket.on('state_update', (data) => {
-            setMetrics(data);
-
-            // Update Heatmap
-            if (data.coordinates && data.coordinates.length > 0) {
-                // Simple grid mapping 10x10
-                const newGrid = new Array(10).fill(0).map(() => new Array(10).fill(0));
-                data.coordinates.forEach(coord => {
-                    const x = Math.floor(coord.x * 10); // 0-9
-                    const y = Math.floor(coord.y * 10); // 0-9
-                    if (x >= 0 && x < 10 && y >= 0 && y < 10) {
-                        newGrid[y][x] += 1;
-                    }
-                });
-                setHeatmapData(newGrid);
+        // The server sends a full 'state_update' keyframe, then 'state_delta' messages with
+        // only the changed fields. Both carry a per-room seq; on a gap we ask for a resync.
+        const applyState = (data, isDelta) => {
+            if (isDelta && data.seq !== seqRef.current + 1) {
+                socket.emit('resync');
+                return;
+            }
+            seqRef.current = data.seq;
+            const next = isDelta ? { ...stateRef.current, ...data } : data;
+            stateRef.current = next;
+            setMetrics(next);
+
+            // Update Heatmap (only when detections changed)
+            if (data.coordinates) {
+                setHeatmapData(buildGrid(decodeCoordinates(data.coordinates)));
             }
 
             // Anomaly Check (Simple client-side check for MVP)
@@ -55,7 +74,14 @@ function DashboardContent() {
                 // Auto dismiss after 5s
                 setTimeout(() => setAnomalyAlert(null), 5000);
             }
+        };
+
+        socket.on('connect', () => {
+            console.log("Connected to WebSocket");
+            socket.emit('subscribe', { channel: 'full', rate: 'realtime' });
         });
+        socket.on('state_update', (data) => applyState(data, false));
+        socket.on('state_delta', (data) => applyState(data, true));
 
         // Fetch Logs Initial and interval
         fetchLogs();
@@ -65,6 +91,7 @@ function DashboardContent() {
         return () => {
             socket.off('connect');
             socket.off('state_update');
+            socket.off('state_delta');
             clearInterval(interval);
         };
     }, [navigate]);
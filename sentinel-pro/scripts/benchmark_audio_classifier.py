@@ -0,0 +1,74 @@
+import sys
+import os
+import time
+import numpy as np
+
+# Add project root to sys path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from backend.core.config import AUDIO_RATE, AUDIO_CHUNK, AUDIO_BUFFER_SECONDS, AUDIO_HOP_SECONDS, AUDIO_N_MFCC
+from engine.audio.audio_module import AudioEngine, AudioInput
+from engine.audio.features import StreamingFeatures
+
+SECONDS = 30
+
+def synthetic_audio(seconds, sr):
+    """Background noise with a few loud, shrill bursts."""
+    rng = np.random.default_rng(0)
+    y = rng.standard_normal(int(seconds * sr)).astype(np.float32) * 0.01
+    t = np.arange(sr * 2) / sr
+    for start in range(5, int(seconds) - 2, 8):
+        burst = 0.3 * np.sin(2 * np.pi * 3000 * t).astype(np.float32)
+        y[start * sr:start * sr + len(burst)] += burst
+    return y
+
+def fallback_model(y, sr):
+    """Throwaway classifier on the real feature layout, used when classifier.pkl is missing."""
+    from sklearn.ensemble import RandomForestClassifier
+    features = StreamingFeatures(sr, AUDIO_BUFFER_SECONDS, n_mfcc=AUDIO_N_MFCC)
+    vectors, labels = [], []
+    for i in range(0, len(y), AUDIO_CHUNK):
+        features.push(y[i:i + AUDIO_CHUNK])
+        vector = features.feature_vector()
+        if vector is not None:
+            vectors.append(vector[0])
+            labels.append(int(vector[0, -2] > 0.05))
+    return RandomForestClassifier(n_estimators=50, random_state=0).fit(vectors, labels)
+
+def run(engine, y, sr, n_mfcc):
+    """Drive engine.analyse() hop by hop, return per-hop wall latencies and total CPU time."""
+    audio_input = AudioInput(None, {0: "main"})
+    audio_input.prepare(sr, n_mfcc)
+    hop = int(AUDIO_HOP_SECONDS * sr)
+    latencies = []
+    cpu_start = time.process_time()
+    for i in range(0, len(y), hop):
+        audio_input.chunks.append(y[i:i + hop])
+        start = time.perf_counter()
+        engine.analyse(audio_input)
+        latencies.append(time.perf_counter() - start)
+    return np.array(latencies), time.process_time() - cpu_start
+
+def report(name, latencies, cpu_seconds):
+    ms = latencies * 1000
+    print(f"{name:<10} p50 {np.percentile(ms, 50):7.3f} ms  p95 {np.percentile(ms, 95):7.3f} ms  "
+          f"max {ms.max():7.3f} ms  CPU {cpu_seconds / SECONDS * 100:5.2f}% of one core")
+
+if __name__ == "__main__":
+    sr = AUDIO_RATE
+    y = synthetic_audio(SECONDS, sr)
+    print(f"Benchmarking {SECONDS}s of audio at {sr}Hz, hop {AUDIO_HOP_SECONDS * 1000:.0f} ms\n")
+
+    engine = AudioEngine()
+    if engine.ml_model is None:
+        print("No classifier.pkl found, training a throwaway RandomForest for the ML timing.\n")
+        model = fallback_model(y, sr)
+    else:
+        model = engine.ml_model
+
+    engine.ml_model = None
+    report("heuristic", *run(engine, y, sr, 0))
+
+    engine.ml_model = model
+    engine.panic_column = engine.find_panic_column(model)
+    report("ml", *run(engine, y, sr, AUDIO_N_MFCC))
@@ -0,0 +1,292 @@
+"""
+End-to-end pipeline benchmark.
+
+Drives the real VisionEngine (process_batch), AudioEngine (analyse), SharedState and
+the hub's monitor tick (SentinelHub.tick through StateBroadcaster, with a stub Socket.IO
+server) from synthetic or recorded inputs, one stage at a time, and
+reports per-stage latency percentiles, throughput and peak memory as JSON so two
+releases can be diffed:
+
+    python scripts/benchmark_pipeline.py --output before.json
+    python scripts/benchmark_pipeline.py --video crowd.mp4 --audio crowd.wav --output after.json
+"""
+import sys
+import os
+import gc
+import json
+import asyncio
+import time
+import wave
+import argparse
+import platform
+import tempfile
+import numpy as np
+import cv2
+
+# Add project root to sys path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from backend.core.config import (
+    AUDIO_RATE, AUDIO_HOP_SECONDS, AUDIO_N_MFCC, STREAM_DEFAULT_TIER, IMG_SIZE
+)
+from engine.shared_state import state
+from engine.vision.annotator import draw_boxes
+from engine.vision.frame_encoder import LazyFrame
+from engine.audio.audio_module import AudioEngine, AudioInput, pcm_to_float
+from benchmark_audio_classifier import synthetic_audio # Same test signal as the classifier benchmark
+
+STAGES = ("capture", "inference", "postprocess", "encode", "publish", "broadcast", "audio")
+
+class StageSamples:
+    """Collects wall-clock samples (seconds) per stage."""
+
+    def __init__(self):
+        self.samples = {stage: [] for stage in STAGES}
+
+    def record(self, stage, seconds):
+        self.samples[stage].append(seconds)
+
+    def wrap(self, obj, attribute, stage):
+        """Replace obj.attribute with a timed version so the engine's own code path is measured."""
+        original = getattr(obj, attribute)
+
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return original(*args, **kwargs)
+            finally:
+                self.record(stage, time.perf_counter() - start)
+        setattr(obj, attribute, timed)
+
+    def summary(self):
+        stages = {}
+        for stage, samples in self.samples.items():
+            if not samples:
+                continue
+            ms = np.array(samples) * 1000
+            stages[stage] = {
+                "count": len(ms),
+                "mean_ms": round(float(ms.mean()), 3),
+                "p50_ms": round(float(np.percentile(ms, 50)), 3),
+                "p95_ms": round(float(np.percentile(ms, 95)), 3),
+                "p99_ms": round(float(np.percentile(ms, 99)), 3),
+                "max_ms": round(float(ms.max()), 3),
+            }
+        return stages
+
+def peak_memory_mb():
+    """Process memory high-water mark, or None if the platform can't tell."""
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # KB on Linux, bytes on macOS
+        return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+    except ImportError:
+        pass
+    try:
+        import psutil
+        return round(psutil.Process().memory_info().peak_wset / (1024 * 1024), 1)
+    except (ImportError, AttributeError):
+        return None
+
+def synthetic_video(path, seconds, fps=25, size=(1280, 720)):
+    """Moving blobs on a noisy background, written to an mp4 replay file."""
+    rng = np.random.default_rng(0)
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"mp4v"), fps, size)
+    background = rng.integers(0, 60, (size[1], size[0], 3), dtype=np.uint8)
+    positions = rng.uniform(0, 1, (12, 2)) * (size[0] - 80, size[1] - 160)
+    velocity = rng.uniform(-6, 6, (12, 2))
+    for _ in range(int(seconds * fps)):
+        frame = background.copy()
+        positions = np.clip(positions + velocity, 0, (size[0] - 80, size[1] - 160))
+        for x, y in positions.astype(int):
+            cv2.rectangle(frame, (x, y), (x + 60, y + 150), (180, 160, 140), -1)
+        writer.write(frame)
+    writer.release()
+
+def load_audio(path):
+    """WAV file as (mono float32 samples, rate); channels are averaged."""
+    with wave.open(path, "rb") as wav:
+        data = pcm_to_float(wav.readframes(wav.getnframes()), wav.getsampwidth())
+        return data.reshape(-1, wav.getnchannels()).mean(axis=1), wav.getframerate()
+
+class StubSocketServer:
+    """
+    Stands in for socketio.AsyncServer: handlers are registered and rooms joined as
+    usual, emits are encoded into Socket.IO packets (JSON + binary attachments) and
+    counted instead of being sent.
+    """
+
+    def __init__(self):
+        self.handlers = {}
+        self.emits = 0
+        self.bytes = 0
+
+    def on(self, event, handler):
+        self.handlers[event] = handler
+
+    def enter_room(self, sid, room):
+        pass
+
+    def leave_room(self, sid, room):
+        pass
+
+    async def emit(self, event, data=None, to=None, room=None):
+        from socketio import packet
+        encoded = packet.Packet(packet.EVENT, data=[event, data]).encode()
+        self.emits += 1
+        self.bytes += sum(len(part) for part in (encoded if isinstance(encoded, list) else [encoded]))
+
+class StubArduino:
+    def send_command(self, command):
+        pass
+
+def build_hub(loop):
+    """SentinelHub on a stub Socket.IO server, one client in each broadcast channel."""
+    from backend.core.sentinel_hub import SentinelHub
+    from backend.core.config import BROADCAST_CHANNELS
+
+    sio = StubSocketServer()
+    hub = SentinelHub(sio)
+    hub.arduino = StubArduino()
+    for channel in BROADCAST_CHANNELS:
+        loop.run_until_complete(hub.broadcaster.on_subscribe(f"bench-{channel}", {"channel": channel}))
+    return hub, sio
+
+def bench_vision(samples, video_path, cameras, max_frames):
+    """Replay video_path as `cameras` identical cameras through VisionEngine.process_batch."""
+    from engine.vision.vision_module import VisionEngine
+
+    engine = VisionEngine(sources=[video_path] * cameras)
+    engine.ensure_model()
+    # Warm-up call so lazy runtime initialisation is not counted as inference
+    engine.model(np.zeros((IMG_SIZE, IMG_SIZE, 3), dtype=np.uint8), verbose=False, imgsz=IMG_SIZE)
+
+    samples.wrap(engine, "model", "inference")
+    weights = engine.weights
+    samples.wrap(engine, "process_result", "postprocess")
+    samples.wrap(state, "update_camera", "publish")
+    samples.wrap(state, "publish_aggregate", "publish")
+
+    def annotate_and_encode(camera_id, frame, xyxy, count):
+        # One simulated viewer: render and encode synchronously instead of on the worker
+        start = time.perf_counter()
+        LazyFrame(draw_boxes(frame, xyxy, count)).jpeg(STREAM_DEFAULT_TIER)
+        samples.record("encode", time.perf_counter() - start)
+    engine.annotator.submit = annotate_and_encode
+    state.has_viewers = lambda camera_id=None: True
+
+    loop = asyncio.new_event_loop()
+    hub, sio = build_hub(loop)
+
+    captures = [cv2.VideoCapture(video_path) for _ in range(cameras)]
+    frames_done = 0
+    start = time.perf_counter()
+    while frames_done < max_frames:
+        batch = []
+        for camera, cap in zip(engine.cameras, captures):
+            t0 = time.perf_counter()
+            ret, frame = cap.read()
+            samples.record("capture", time.perf_counter() - t0)
+            if ret:
+                batch.append((camera.camera_id, frame))
+        if not batch:
+            break
+        engine.process_batch(batch)
+        if engine.weights != weights:
+            # A model switch replaces the timed wrapper: time the new model too
+            print(f"[Benchmark] Model switched to {engine.weights} mid-run", file=sys.stderr)
+            samples.wrap(engine, "model", "inference")
+            weights = engine.weights
+        bench_broadcast(samples, loop, hub)
+        frames_done += len(batch)
+    elapsed = time.perf_counter() - start
+    for cap in captures:
+        cap.release()
+    loop.close()
+
+    return {
+        "frames": frames_done,
+        "cameras": cameras,
+        "seconds": round(elapsed, 3),
+        "fps": round(frames_done / elapsed, 2) if elapsed else 0.0,
+        "backend": engine.backend,
+        "model": engine.weights,
+        "broadcast_emits": sio.emits,
+        "broadcast_kb": round(sio.bytes / 1024, 1),
+    }
+
+def bench_broadcast(samples, loop, hub):
+    """One SentinelHub.tick per processed batch: snapshot, fuse, per-room deltas, packet encoding."""
+    start = time.perf_counter()
+    loop.run_until_complete(hub.tick())
+    samples.record("broadcast", time.perf_counter() - start)
+
+def bench_audio(samples, y, sr, use_ml):
+    """Feed samples hop by hop through AudioEngine.analyse (heuristic or classifier)."""
+    engine = AudioEngine(inputs={})
+    if not use_ml:
+        engine.ml_model = None
+    audio_input = AudioInput(None, {0: "main"})
+    audio_input.prepare(sr, AUDIO_N_MFCC if engine.ml_model is not None else 0)
+    hop = int(AUDIO_HOP_SECONDS * sr)
+
+    start = time.perf_counter()
+    for i in range(0, len(y), hop):
+        audio_input.chunks.append(y[i:i + hop])
+        t0 = time.perf_counter()
+        engine.analyse(audio_input)
+        samples.record("audio", time.perf_counter() - t0)
+    elapsed = time.perf_counter() - start
+
+    return {
+        "audio_seconds": round(len(y) / sr, 2),
+        "seconds": round(elapsed, 3),
+        "realtime_factor": round(len(y) / sr / elapsed, 1) if elapsed else 0.0,
+        "detector": "ml" if engine.ml_model is not None else "heuristic",
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Sentinel-Pro end-to-end pipeline benchmark")
+    parser.add_argument("--video", help="Recorded video to replay (default: synthetic)")
+    parser.add_argument("--audio", help="Recorded WAV to replay (default: synthetic)")
+    parser.add_argument("--seconds", type=float, default=20, help="Length of synthetic inputs")
+    parser.add_argument("--frames", type=int, default=300, help="Max frames per run")
+    parser.add_argument("--cameras", type=int, default=1, help="Cameras replaying the same video")
+    parser.add_argument("--ml", action="store_true", help="Use the audio classifier if one is installed")
+    parser.add_argument("--skip-vision", action="store_true")
+    parser.add_argument("--skip-audio", action="store_true")
+    parser.add_argument("--output", help="Write the JSON report here as well as to stdout")
+    args = parser.parse_args()
+
+    gc.collect()
+    samples = StageSamples()
+    report = {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "platform": platform.platform(),
+        "python": platform.python_version(),
+        "inputs": {"video": args.video or "synthetic", "audio": args.audio or "synthetic"},
+    }
+
+    if not args.skip_vision:
+        video = args.video
+        if video is None:
+            video = os.path.join(tempfile.gettempdir(), "sentinel_benchmark.mp4")
+            synthetic_video(video, args.seconds)
+        report["vision"] = bench_vision(samples, video, args.cameras, args.frames)
+
+    if not args.skip_audio:
+        y, sr = load_audio(args.audio) if args.audio else (synthetic_audio(args.seconds, AUDIO_RATE), AUDIO_RATE)
+        report["audio"] = bench_audio(samples, y, sr, args.ml)
+
+    report["stages"] = samples.summary()
+    report["peak_rss_mb"] = peak_memory_mb()
+
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+
+if __name__ == "__main__":
+    main()
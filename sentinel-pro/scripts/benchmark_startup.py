@@ -0,0 +1,63 @@
+"""
+Backend cold start benchmark.
+
+Imports backend.main in fresh interpreters (what `uvicorn --reload` does on every
+change) and reports the import time and which heavy modules came along, as JSON:
+
+    python scripts/benchmark_startup.py
+    API_ONLY=true python scripts/benchmark_startup.py --runs 10
+"""
+import sys
+import os
+import json
+import argparse
+import subprocess
+import statistics
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+# Modules the API process should not need until the engines are loaded
+HEAVY_MODULES = ("ultralytics", "torch", "cv2", "librosa", "pyaudio", "joblib", "serial")
+
+PROBE = """
+import sys, time, json
+start = time.perf_counter()
+import backend.main
+elapsed = time.perf_counter() - start
+print(json.dumps({"seconds": elapsed, "loaded": [m for m in %r if m in sys.modules]}))
+""" % (HEAVY_MODULES,)
+
+def measure(runs):
+    samples, loaded = [], set()
+    for _ in range(runs):
+        result = subprocess.run([sys.executable, "-c", PROBE], cwd=ROOT, capture_output=True, text=True)
+        if result.returncode != 0:
+            raise SystemExit(f"Import of backend.main failed:\n{result.stderr}")
+        probe = json.loads(result.stdout.strip().splitlines()[-1])
+        samples.append(probe["seconds"])
+        loaded.update(probe["loaded"])
+    return {
+        "runs": runs,
+        "api_only": os.getenv("API_ONLY", "false").lower() == "true",
+        "import_seconds": {
+            "mean": statistics.mean(samples),
+            "min": min(samples),
+            "max": max(samples),
+        },
+        "heavy_modules_loaded": sorted(loaded),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Sentinel-Pro backend cold start benchmark")
+    parser.add_argument("--runs", type=int, default=5, help="Fresh interpreters to time")
+    parser.add_argument("--output", help="Write the JSON report here as well as to stdout")
+    args = parser.parse_args()
+
+    text = json.dumps(measure(args.runs), indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+import sys
+import os
+import pty
+import select
+import tempfile
+import time
+
+# Add project root to sys path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from backend.core.serial_bridge import ArduinoBridge
+
+class FakeArduino:
+    """A pty standing in for the board: the bridge opens the slave end, we read the master."""
+
+    def __init__(self):
+        self.master, self.slave = pty.openpty()
+        self.path = os.ttyname(self.slave)
+        self.buffer = b""
+
+    def read_lines(self, wait=0.5):
+        deadline = time.time() + wait
+        while True:
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                break
+            ready, _, _ = select.select([self.master], [], [], remaining)
+            if ready:
+                self.buffer += os.read(self.master, 1024)
+        *lines, self.buffer = self.buffer.split(b"\n")
+        return [line.strip(b"\r").decode() for line in lines]
+
+    def unplug(self):
+        os.close(self.master)
+        os.close(self.slave)
+
+def check(name, ok, detail=""):
+    print(f"{'PASS' if ok else 'FAIL'}: {name} {detail}")
+    return ok
+
+def test_serial_bridge():
+    results = []
+    link = os.path.join(tempfile.mkdtemp(), "arduino")
+
+    print("Starting bridge on a port that does not exist yet...")
+    started = time.time()
+    bridge = ArduinoBridge(port=link, reset_seconds=0.2)
+    bridge.start()
+    bridge.send_command("RISK:SAFE")
+    elapsed = time.time() - started
+    results.append(check("construct/start/send never block", elapsed < 0.1, f"({elapsed * 1000:.1f} ms)"))
+
+    time.sleep(1.5)
+    print("Plugging in the fake device...")
+    device = FakeArduino()
+    os.symlink(device.path, link)
+    lines = device.read_lines(wait=4.0) # Picked up by the backoff retry
+    results.append(check("connects in the background and sends the pending command", lines == ["RISK:SAFE"], lines))
+
+    for _ in range(50):
+        bridge.send_command("RISK:SAFE")
+    lines = device.read_lines()
+    results.append(check("repeated command is not re-sent", lines == [], lines))
+
+    bridge.send_command("RISK:WARN")
+    lines = device.read_lines()
+    results.append(check("transition is sent once", lines == ["RISK:WARN"], lines))
+
+    for command in ["RISK:DANGER", "RISK:WARN", "RISK:SAFE", "RISK:DANGER"] * 25:
+        bridge.send_command(command)
+    lines = device.read_lines()
+    deduped = all(a != b for a, b in zip(lines, lines[1:]))
+    results.append(check("burst coalesces, device ends on the latest command",
+                         lines[-1:] == ["RISK:DANGER"] and deduped and len(lines) <= 100, f"({len(lines)} writes)"))
+
+    print("Unplugging the fake device...")
+    device.unplug()
+    bridge.send_command("RISK:WARN") # Write fails, bridge starts reconnecting
+    time.sleep(0.5)
+    results.append(check("write error marks the bridge disconnected", not bridge.connected))
+
+    device = FakeArduino()
+    os.remove(link)
+    os.symlink(device.path, link)
+    lines = device.read_lines(wait=4.0)
+    results.append(check("reconnects and re-sends the current command", lines == ["RISK:WARN"], lines))
+
+    bridge.stop()
+    bridge.join(timeout=2.0)
+    results.append(check("writer thread stops", not bridge.is_alive()))
+    device.unplug()
+
+    print("Test Complete." if all(results) else "Test FAILED.")
+    return all(results)
+
+if __name__ == "__main__":
+    sys.exit(0 if test_serial_bridge() else 1)